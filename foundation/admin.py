@@ -7,6 +7,7 @@ from mptt.admin import MPTTModelAdmin
 from foundation.models import (
     CurrencyMaster,
     CurrencyRate,
+    CurrencyRateLatest,
     User,
     UserAuthenticationOption,
     UserInfo,
@@ -152,6 +153,25 @@ class CurrencyRateAdmin(BaseAdmin):
         "sell_rate",
         "effective_date",
     ]
+    list_select_related = ["currency_from", "currency_to"]
+
+
+@admin.register(CurrencyRateLatest)
+class CurrencyRateLatestAdmin(admin.ModelAdmin):
+    list_display = [
+        "currency_from",
+        "currency_to",
+        "buy_rate",
+        "sell_rate",
+        "effective_date",
+    ]
+    list_select_related = ["currency_from", "currency_to"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 admin.site.site_title = config.SITE_NAME
@@ -54,3 +54,9 @@ class InvalidOtpException(APIException):
     status_code = 400
     default_detail = _("Invalid otp OR No any active user found for given otp")
     default_code = "invalid-otp"
+
+
+class TooManyOtpAttemptsException(APIException):
+    status_code = 429
+    default_detail = _("Too many wrong otp attempts. Please request a new otp.")
+    default_code = "otp-attempts-exceeded"
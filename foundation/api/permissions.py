@@ -0,0 +1,54 @@
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import BasePermission
+
+from foundation.utils.permissions import has_menu_action
+
+
+class HasMenuAction(BasePermission):
+    """
+    Allows access if the user holds the menu action matching the request on
+    the view's ``menu_slug``.
+
+    Viewset actions are mapped through ``action_map``; views can extend it
+    for custom actions with a ``menu_action_map`` attribute. Views without
+    an action are mapped by HTTP method.
+    """
+
+    action_map = {
+        "list": "view",
+        "retrieve": "view",
+        "create": "add",
+        "update": "edit",
+        "partial_update": "edit",
+        "destroy": "delete",
+    }
+    method_map = {
+        "GET": "view",
+        "HEAD": "view",
+        "OPTIONS": "view",
+        "POST": "add",
+        "PUT": "edit",
+        "PATCH": "edit",
+        "DELETE": "delete",
+    }
+
+    def get_menu_action(self, request, view):
+        view_action = getattr(view, "action", None)
+        if view_action is None:
+            return self.method_map.get(request.method)
+
+        action_map = {**self.action_map, **getattr(view, "menu_action_map", {})}
+        return action_map.get(view_action)
+
+    def has_permission(self, request, view):
+        menu_slug = getattr(view, "menu_slug", None)
+        if menu_slug is None:
+            raise ImproperlyConfigured(
+                f"{view.__class__.__name__} must define menu_slug to use HasMenuAction."
+            )
+
+        action = self.get_menu_action(request, view)
+        if action is None:
+            return False
+
+        return has_menu_action(request.user, menu_slug, action)
@@ -35,6 +35,7 @@ from foundation.models import (
     UserType,
     Menu,
     MenuAction,
+    UserEffectivePermission,
     UserMenuSecurity,
     UserTypeMenuPermission,
     UsersMenuPermission,
@@ -45,6 +46,8 @@ from foundation.utils.notifications import (
     send_whatsapp_notification,
     welcome_email_notification,
 )
+from foundation.utils.permissions import mask_to_bits
+from foundation.utils.rates import get_currency_code_map
 
 
 def get_user_information(user: User) -> Dict:
@@ -54,7 +57,7 @@ def get_user_information(user: User) -> Dict:
         "id": user.id,
         "name": user.name,
         "email": user.email,
-        "user_type": user.user_type.id if user.user_type else None,
+        "user_type": user.user_type_id,
         "language":user.language if user.language else None,
     }
 
@@ -296,6 +299,7 @@ class OtpVerifySerializer(serializers.Serializer):
     Serializer for verify otp
     """
 
+    email = serializers.EmailField()
     otp = serializers.CharField()
 
 
@@ -443,6 +447,52 @@ class CurrencyMasterSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class CurrencyCodeField(serializers.CharField):
+    """A currency code, validated into a CurrencyMaster id."""
+
+    def to_internal_value(self, data):
+        code = super().to_internal_value(data).strip().upper()
+        codes = get_currency_code_map()
+        if code not in codes:
+            raise serializers.ValidationError(
+                _("Unknown currency %(code)s.") % {"code": code}
+            )
+        return codes[code]
+
+
+class CurrencyConvertItemSerializer(serializers.Serializer):
+    """
+    Serializer for one amount to convert between two currency codes.
+    """
+
+    amount = serializers.DecimalField(max_digits=None, decimal_places=None)
+    currency_from = CurrencyCodeField()
+    currency_to = CurrencyCodeField()
+    at = serializers.DateTimeField(required=False, allow_null=True)
+
+    def get_fields(self):
+        # "from" is a keyword, so it can't be declared directly
+        fields = super().get_fields()
+        fields["from"] = fields.pop("currency_from")
+        fields["to"] = fields.pop("currency_to")
+        return fields
+
+
+class CurrencyRateHistorySerializer(CurrencyConvertItemSerializer):
+    """
+    Query parameters of the currency rate history.
+    """
+
+    amount = None
+    at = None
+    interval = serializers.ChoiceField(
+        choices=("hour", "day", "week", "month"), default="day"
+    )
+    kind = serializers.ChoiceField(choices=("ohlc", "last"), default="ohlc")
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+
 class MenuSerializer(serializers.ModelSerializer):
     class Meta:
         model = Menu
@@ -460,23 +510,45 @@ class MenuSerializer(serializers.ModelSerializer):
         )
 
 
-class MenuActionSerializer(serializers.ModelSerializer):
+class MenuTreeSerializer(serializers.ModelSerializer):
+    """
+    Nested menu serializer. Expects nodes prepared by ``get_cached_trees``
+    so walking the children does not query the database.
+    """
+
+    children = serializers.SerializerMethodField()
+
     class Meta:
-        model = MenuAction
-        fields = ("id", "action", "icon", "class_name")
+        model = Menu
+        fields = (
+            "id",
+            "name",
+            "slug",
+            "icon",
+            "url",
+            "order",
+            "children",
+        )
 
+    def get_children(self, obj):
+        children = sorted(obj.get_children(), key=lambda menu: menu.order)
+        return MenuTreeSerializer(children, many=True, context=self.context).data
+
+
+class MenuOrderSerializer(serializers.Serializer):
+    """
+    Serializer for one entry of a bulk menu reorder.
+    """
+
+    id = serializers.IntegerField()
+    order = serializers.IntegerField(required=False)
+    parent = serializers.IntegerField(required=False, allow_null=True)
 
-class UserTypePermissionSerializer(serializers.ModelSerializer):
-    menu = MenuSerializer()
-    menu_action = MenuActionSerializer(many=True)
 
+class MenuActionSerializer(serializers.ModelSerializer):
     class Meta:
-        model = UserTypeMenuPermission
-        fields = [
-            "menu",
-            "menu_action",
-        ]
-        depth = 1
+        model = MenuAction
+        fields = ("id", "action", "icon", "class_name")
 
 
 class TypeMenuSecuritySerializer(serializers.ModelSerializer):
@@ -493,7 +565,7 @@ class TypeMenuSecuritySerializer(serializers.ModelSerializer):
 class TypeNestedMenuSecuritySerializer(serializers.ModelSerializer):
     class Meta:
         model = UserTypeMenuPermission
-        exclude = ("user_type",)
+        exclude = ("user_type", "action_mask")
         depth = 2
 
 
@@ -523,10 +595,63 @@ class UserTypeNestedSecuritySerializer(serializers.ModelSerializer):
         )
 
 
+class MenuPermissionMatrixSerializer(serializers.Serializer):
+    """
+    Every action in ``menu_action`` on every menu in ``menu``.
+    """
+
+    menu = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    menu_action = serializers.ListField(
+        child=serializers.CharField(max_length=10), allow_empty=False
+    )
+
+
+class BulkMenuPermissionSerializer(serializers.Serializer):
+    """
+    Serializer for granting and revoking menu actions in bulk.
+    """
+
+    grant = MenuPermissionMatrixSerializer(many=True, required=False, default=list)
+    revoke = MenuPermissionMatrixSerializer(many=True, required=False, default=list)
+
+    def validate(self, validated_data):
+        rows = validated_data["grant"] + validated_data["revoke"]
+        menu_ids = {menu_id for row in rows for menu_id in row["menu"]}
+        action_names = {action for row in rows for action in row["menu_action"]}
+
+        missing_menus = menu_ids - set(
+            Menu.objects.filter(pk__in=menu_ids).values_list("pk", flat=True)
+        )
+        action_ids = dict(
+            MenuAction.objects.filter(action__in=action_names).values_list(
+                "action", "pk"
+            )
+        )
+        missing_actions = action_names - set(action_ids)
+
+        errors = {}
+        if missing_menus:
+            errors["menu"] = [f"Invalid menu id {pk}." for pk in sorted(missing_menus)]
+        if missing_actions:
+            errors["menu_action"] = [
+                f"Invalid menu action {name}." for name in sorted(missing_actions)
+            ]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        for key in ("grant", "revoke"):
+            validated_data[key] = [
+                (row["menu"], [action_ids[name] for name in row["menu_action"]])
+                for row in validated_data[key]
+            ]
+
+        return validated_data
+
+
 class UsersMenuPermissionSerializer(serializers.ModelSerializer):
     class Meta:
         model = UsersMenuPermission
-        exclude = ("users_menu",)
+        exclude = ("users_menu", "action_mask")
 
 
 class UsersNestedMenuPermissionSerializer(UsersMenuPermissionSerializer):
@@ -559,14 +684,27 @@ class UserNestedSecuritySerializer(serializers.ModelSerializer):
         depth = 1
 
 
-class UserPermissionSerializer(serializers.ModelSerializer):
+class UserEffectivePermissionSerializer(serializers.ModelSerializer):
+    """
+    Expects ``menu_actions`` in the context: serialized menu actions keyed by
+    their mask bit, used to expand ``action_mask`` without joining the actions.
+    """
+
     menu = MenuSerializer()
-    menu_action = MenuActionSerializer(many=True)
+    menu_action = serializers.SerializerMethodField()
 
     class Meta:
-        model = UsersMenuPermission
+        model = UserEffectivePermission
         fields = [
             "menu",
             "menu_action",
         ]
-        depth = 1
+
+    def get_menu_action(self, obj):
+        menu_actions = self.context["menu_actions"]
+        actions = [
+            menu_actions[bit]
+            for bit in mask_to_bits(obj.action_mask)
+            if bit in menu_actions
+        ]
+        return sorted(actions, key=lambda action: action["id"])
@@ -0,0 +1,30 @@
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
+
+from foundation.utils.blacklist import blacklist_filter
+from foundation.utils.cache import cache_is_shared
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    Refresh token that only checks the blacklist table when the blacklist
+    Bloom filter reports a possible hit. Without a shared cache the filter
+    can't learn about tokens blacklisted by other processes, so the table is
+    always checked.
+    """
+
+    def check_blacklist(self) -> None:
+        if not cache_is_shared() or blacklist_filter.might_contain(
+            self.payload[api_settings.JTI_CLAIM]
+        ):
+            super().check_blacklist()
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+class FilteredTokenRefreshView(TokenRefreshView):
+    serializer_class = FilteredTokenRefreshSerializer
@@ -1,11 +1,14 @@
 from dj_rest_auth.views import PasswordChangeView, PasswordResetConfirmView
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenObtainPairView
 
+from foundation.api.tokens import FilteredTokenRefreshView
 from foundation.api.views import (
     AppleLogin,
+    CurrencyConvertView,
     CurrencyMasterViewSet,
+    CurrencyRateHistoryView,
     EmailSendView,
     GoogleLogin,
     LoginAPIView,
@@ -21,8 +24,13 @@ from foundation.api.views import (
     UserSecurityViewSet,
     MenuViewSet,
     MenuActionViewSet,
+    MenuReorderView,
     WhatsAPPView,
+    anonymous_menu,
     google_token,
+    login_async,
+    otp_generate_async,
+    register_async,
 )
 
 app_name = "api.foundation"
@@ -46,6 +54,10 @@ urlpatterns = [
     path("auth/logout/", LogoutView.as_view(), name="auth_logout"),
     # For OTP
     path("auth/otp_generate/", OTPGenerateAPIView.as_view(), name="otp_generate"),
+    # Same as above, run in the bounded auth pool
+    path("auth/async/register/", register_async, name="user_register_async"),
+    path("auth/async/login/", login_async, name="user_login_async"),
+    path("auth/async/otp_generate/", otp_generate_async, name="otp_generate_async"),
     path(
         "auth/otp_verification/",
         OTPVerificationAPIView.as_view(),
@@ -53,7 +65,7 @@ urlpatterns = [
     ),
     # Token apis
     # path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/refresh/", FilteredTokenRefreshView.as_view(), name="token_refresh"),
     # dj rest auth
     path("auth/password/reset/", PasswordResetView.as_view(), name="password_reset"),
     # path(
@@ -79,6 +91,14 @@ urlpatterns = [
     path("whats_app/", WhatsAPPView.as_view(), name="whats_app_message"),
     # User permission menus
     path("permission/", UserPermissionView.as_view(), name="user_permission"),
+    path("menus/anonymous/", anonymous_menu, name="anonymous_menu"),
+    path("menus/reorder/", MenuReorderView.as_view(), name="menu_reorder"),
+    path("currency/convert/", CurrencyConvertView.as_view(), name="currency_convert"),
+    path(
+        "currency/history/",
+        CurrencyRateHistoryView.as_view(),
+        name="currency_rate_history",
+    ),
 ]
 
 urlpatterns += router.urls
@@ -1,4 +1,24 @@
+import gzip
+from functools import partial
 from importlib import import_module
+from urllib.parse import urljoin
+
+from django.core.cache import cache
+from mptt.utils import get_cached_trees
+from rest_framework.renderers import JSONRenderer
+
+from foundation.models import Menu
+from foundation.utils.cache import MENU_VERSION_KEY, get_version
+
+from .serializers import MenuTreeSerializer
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+ANONYMOUS_MENU_CACHE_KEY = "foundation:anonymous_menu"
+ANONYMOUS_MENU_BASE_URLS_CACHE_KEY = "foundation:anonymous_menu_base_urls"
 
 
 def import_callable(path_or_callable):
@@ -10,15 +30,88 @@ def import_callable(path_or_callable):
         return getattr(import_module(package), attr)
 
 
-def mergedicts(dict1, dict2):
-    d = dict1["menu_action"]
-    for k in dict2["menu_action"]:
-        if k not in dict1["menu_action"]:
-            d.append(k)
+def get_menu_tree(authenticated=True):
+    """
+    Return the nested menu tree visible to authenticated or anonymous users.
+
+    The whole tree is loaded in one query and the serialized result is kept in
+    the Django cache until the next Menu change. Icons are relative URLs, see
+    ``with_absolute_icons``.
+    """
+
+    visibility = "authenticated" if authenticated else "anonymous"
+    cache_key = f"foundation:menu_tree:{visibility}"
+    version = get_version(MENU_VERSION_KEY)
+
+    cached = cache.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    queryset = Menu.objects.filter(**{f"visible_for_{visibility}": True}).order_by(
+        "tree_id", "lft"
+    )
+    # Menus whose parent is hidden come back as top nodes; hide them as well
+    roots = [menu for menu in get_cached_trees(queryset) if menu.parent_id is None]
+    roots.sort(key=lambda menu: menu.order)
+    data = MenuTreeSerializer(roots, many=True).data
+
+    cache.set(cache_key, (version, data), timeout=None)
+    return data
+
+
+def with_absolute_icons(tree, build_absolute_uri):
+    """
+    Return a copy of a serialized menu tree with icon URLs made absolute by
+    ``build_absolute_uri``, e.g. ``request.build_absolute_uri``.
+    """
+
+    return [
+        {
+            **menu,
+            "icon": menu["icon"] and build_absolute_uri(menu["icon"]),
+            "children": with_absolute_icons(menu["children"], build_absolute_uri),
+        }
+        for menu in tree
+    ]
+
+
+def render_anonymous_menu(base_url):
+    """
+    Pre-render the anonymous menu tree, with icon URLs relative to
+    ``base_url``, as JSON bytes plus gzip and, when the ``brotli`` package is
+    installed, brotli variants.
+
+    Returns ``(etag of the identity body, {content encoding: body})``.
+    """
+
+    version = get_version(MENU_VERSION_KEY)
+    cache_key = f"{ANONYMOUS_MENU_CACHE_KEY}:{base_url}"
+
+    cached = cache.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    tree = with_absolute_icons(
+        get_menu_tree(authenticated=False), partial(urljoin, base_url)
+    )
+    body = JSONRenderer().render(tree)
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body)
+
+    etag = f'"{version}"'
+    cache.set(cache_key, (version, etag, variants), timeout=None)
+
+    base_urls = cache.get(ANONYMOUS_MENU_BASE_URLS_CACHE_KEY, set())
+    if base_url not in base_urls:
+        cache.set(
+            ANONYMOUS_MENU_BASE_URLS_CACHE_KEY, base_urls | {base_url}, timeout=None
+        )
+    return etag, variants
+
 
-    return_dict = {
-        "menu": dict1["menu"],
-        "menu_action": d,
-    }
+def warm_anonymous_menus():
+    """Render the anonymous menu for every base URL it was served from."""
 
-    return return_dict
+    for base_url in cache.get(ANONYMOUS_MENU_BASE_URLS_CACHE_KEY, set()):
+        render_anonymous_menu(base_url)
@@ -1,4 +1,7 @@
-from typing import Type
+import hashlib
+import json
+from collections import defaultdict
+from typing import Sequence, Type, Union
 
 from allauth.socialaccount.providers.apple.views import (
     AppleOAuth2Adapter,
@@ -6,24 +9,37 @@ from allauth.socialaccount.providers.apple.views import (
 )
 from allauth.socialaccount.providers.google.views import GoogleOAuth2Adapter
 from allauth.socialaccount.providers.oauth2.client import OAuth2Client
+from asgiref.sync import sync_to_async
 from dj_rest_auth.registration.views import SocialLoginView
 from django.conf import settings
-from django.db.models import Model, ProtectedError
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db.models import Model, Prefetch, ProtectedError
 from django.utils import timezone
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from django.utils.translation import gettext as _
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
 from rest_framework import generics, status, views, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import Throttled, ValidationError
 from rest_framework.parsers import FormParser, MultiPartParser
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 
 from foundation.api.exceptions import (
     ExpiredOtpException,
     InvalidOtpException,
     ProtectedErrorException,
+    TooManyOtpAttemptsException,
 )
 from foundation.api.serializers import (
+    BulkMenuPermissionSerializer,
+    CurrencyConvertItemSerializer,
+    CurrencyRateHistorySerializer,
+    MenuOrderSerializer,
     CurrencyMasterSerializer,
     CustomSocialLoginSerializer,
     EmailSendSerializer,
@@ -36,16 +52,21 @@ from foundation.api.serializers import (
     UserTypeSerializer,
     WhatsAPPSerializer,
     UserSecuritySerializer,
-    UserTypePermissionSerializer,
     UserTypeSecuritySerializer,
     UserTypeNestedSecuritySerializer,
     UserNestedSecuritySerializer,
     MenuSerializer,
     MenuActionSerializer,
-    UserPermissionSerializer,
+    UserEffectivePermissionSerializer,
     get_tokens_for_user,
     get_user_information,
 )
+from foundation.api.throttling import (
+    EmailRateThrottle,
+    IPRateThrottle,
+    check_throttles,
+)
+from foundation.api.tokens import FilteredRefreshToken, FilteredTokenRefreshView
 from foundation.models import (
     CurrencyMaster,
     User,
@@ -53,12 +74,31 @@ from foundation.models import (
     UserType,
     Menu,
     MenuAction,
+    UserEffectivePermission,
     UserMenuSecurity,
     UserTypeMenuPermission,
     UsersMenuPermission,
 )
+from foundation.utils.cache import (
+    MENU_VERSION_KEY,
+    cache_is_shared,
+    get_versions,
+    permission_version_key,
+)
+from foundation.utils.converter import currency_convert_many, rate_table
+from foundation.utils.menus import reorder_menus
+from foundation.utils.otp import (
+    OTP_EXPIRED,
+    OTP_LOCKED,
+    OTP_PURPOSE_LOGIN,
+    OTP_VALID,
+    verify_otp,
+)
+from foundation.utils.permissions import bulk_update_user_type_permissions
+from foundation.utils.pool import PoolFull, auth_pool
+from foundation.utils.rates import rate_history
 from .app_settings import UserSerializer
-from .utils import mergedicts
+from .utils import get_menu_tree, render_anonymous_menu, with_absolute_icons
 
 
 class RegistrationAPIView(generics.GenericAPIView):
@@ -92,15 +132,16 @@ class LoginAPIView(generics.GenericAPIView):
 
     serializer_class = LoginSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+    throttle_scope = "login"
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        email = request.data.get("email")
-        user = User.objects.get(email=email, is_active=True)
+        user = serializer.validated_data["user"]
 
         try:
-            user_authentication = UserAuthenticationOption.objects.get(user=user)
+            user_authentication = user.userauth
 
             if user_authentication.two_step_verification:
                 return Response(
@@ -127,6 +168,8 @@ class OTPGenerateAPIView(generics.GenericAPIView):
 
     serializer_class = OTPGenerateSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+    throttle_scope = "login"
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
@@ -146,31 +189,37 @@ class OTPVerificationAPIView(generics.GenericAPIView):
 
     serializer_class = OtpVerifySerializer
     permission_classes = [AllowAny]
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+    throttle_scope = "otp_verify"
 
     def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
         try:
-            otp = request.data.get("otp")
-            user_auth = UserAuthenticationOption.objects.get(
-                otp=otp, user__is_active=True
+            user = User.objects.get(
+                email=serializer.validated_data["email"], is_active=True
             )
-            now = timezone.now()
-
-            if user_auth.otp_expired_at > now:
-                user_auth.otp = None
-                user_auth.user.last_login = now
-                user_auth.save()
+        except User.DoesNotExist:
+            raise InvalidOtpException()
 
-                user = user_auth.user
+        result = verify_otp(
+            user.pk, OTP_PURPOSE_LOGIN, serializer.validated_data["otp"]
+        )
+        if result == OTP_EXPIRED:
+            raise ExpiredOtpException()
+        if result == OTP_LOCKED:
+            raise TooManyOtpAttemptsException()
+        if result != OTP_VALID:
+            raise InvalidOtpException()
 
-                context = {"user": get_user_information(user)}
-                context.update(get_tokens_for_user(user))
+        user.last_login = timezone.now()
+        User.objects.filter(pk=user.pk).update(last_login=user.last_login)
 
-                return Response(context, status=status.HTTP_200_OK)
-            else:
-                raise ExpiredOtpException()
+        context = {"user": get_user_information(user)}
+        context.update(get_tokens_for_user(user))
 
-        except UserAuthenticationOption.DoesNotExist:
-            raise InvalidOtpException()
+        return Response(context, status=status.HTTP_200_OK)
 
 
 class LogoutView(views.APIView):
@@ -184,7 +233,7 @@ class LogoutView(views.APIView):
     def post(self, request):
         try:
             refresh_token = request.data["refresh_token"]
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
             return Response({"details": "Successful Logout"}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -226,9 +275,8 @@ class GoogleLogin(CustomSocialLoginView):
 def google_token(request):
     if "code" not in request.body.decode():
         from rest_framework_simplejwt.settings import api_settings as jwt_settings
-        from rest_framework_simplejwt.views import TokenRefreshView
 
-        class RefreshNuxtAuth(TokenRefreshView):
+        class RefreshNuxtAuth(FilteredTokenRefreshView):
             # By default, Nuxt auth accept and expect postfix "_token"
             # while simple_jwt library doesnt accept nor expect that postfix
             def post(self, request, *args, **kwargs):
@@ -246,6 +294,98 @@ def google_token(request):
         return GoogleLogin.as_view()(request)
 
 
+def _render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, "render"):
+        response.render()
+    return response
+
+
+def run_in_auth_pool(view):
+    """
+    Turn a view doing password hashing into an async view that runs it in
+    the bounded auth pool, answering 503 when the pool is full so auth
+    bursts can't take the workers serving everything else.
+    """
+
+    async def pooled_view(request, *args, **kwargs):
+        # Reject throttled requests before they take a place in the pool
+        try:
+            await sync_to_async(check_throttles)(view.view_class, request)
+        except Throttled as exc:
+            response = JsonResponse(
+                {"detail": exc.detail}, status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response["Retry-After"] = "%d" % exc.wait
+            return response
+
+        try:
+            return await auth_pool.run(_render_view, view, request, *args, **kwargs)
+        except PoolFull:
+            response = JsonResponse(
+                {"detail": _("Too many authentication requests. Try again later.")},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response["Retry-After"] = "1"
+            return response
+
+    # DRF views do their own CSRF checks
+    pooled_view.csrf_exempt = True
+    return pooled_view
+
+
+login_async = run_in_auth_pool(LoginAPIView.as_view())
+otp_generate_async = run_in_auth_pool(OTPGenerateAPIView.as_view())
+register_async = run_in_auth_pool(RegistrationAPIView.as_view())
+
+
+def _accepted_encodings(request):
+    encodings = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _sep, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+@require_safe
+def anonymous_menu(request):
+    """
+    Serve the pre-rendered anonymous menu tree without touching the database
+    or the serializers, compressed when the client accepts it.
+    """
+    etag, variants = render_anonymous_menu(request.build_absolute_uri("/"))
+
+    accepted = _accepted_encodings(request)
+    encoding = next(
+        (
+            coding
+            for coding in ("br", "gzip")
+            if coding in variants and coding in accepted
+        ),
+        "identity",
+    )
+    if encoding != "identity":
+        # Each encoding is a different representation and needs its own tag
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(variants[encoding], content_type="application/json")
+        if encoding != "identity":
+            response["Content-Encoding"] = encoding
+
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Accept-Encoding",))
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=getattr(settings, "FOUNDATION_ANONYMOUS_MENU_MAX_AGE", 3600),
+    )
+    return response
+
+
 class AppleLogin(SocialLoginView):
     adapter_class = AppleOAuth2Adapter
     callback_url = settings.CALLBACK_URL
@@ -264,6 +404,8 @@ class PasswordResetView(generics.GenericAPIView):
     permission_classes = [
         AllowAny,
     ]
+    throttle_classes = [IPRateThrottle, EmailRateThrottle]
+    throttle_scope = "password_reset"
 
     def post(self, request, *args, **kwargs):
         # Create a serializer with request.data
@@ -298,15 +440,47 @@ class BaseModelViewSet(viewsets.ModelViewSet):
             raise ProtectedErrorException
 
 
+def user_relation_prefetches(prefix, nested=False):
+    """
+    Prefetches for the groups and permissions of users serialized under
+    ``prefix``. With ``nested`` they render as objects, otherwise as primary
+    keys, which only need the id column.
+    """
+    if nested:
+        groups = Group.objects.prefetch_related(
+            Prefetch("permissions", queryset=Permission.objects.only("id"))
+        )
+        permissions = Permission.objects.all()
+    else:
+        groups = Group.objects.only("id")
+        permissions = Permission.objects.only("id")
+
+    return [
+        Prefetch(f"{prefix}groups", queryset=groups),
+        Prefetch(f"{prefix}user_permissions", queryset=permissions),
+    ]
+
+
 class MasterGenericViewSet(BaseModelViewSet):
     """
     A generic viewset for viewing and editing master instances.
     """
 
     model: Type[Model]
+    # Query plan for the nested read serializers, applied to list/retrieve
+    select_related_fields: Sequence[str] = ()
+    prefetch_related_fields: Sequence[Union[str, Prefetch]] = ()
 
     def get_queryset(self):
-        return self.model.objects.all()
+        queryset = self.model.objects.all()
+
+        if self.action in ["list", "retrieve"]:
+            if self.select_related_fields:
+                queryset = queryset.select_related(*self.select_related_fields)
+            if self.prefetch_related_fields:
+                queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+
+        return queryset
 
 
 class EmailSendView(generics.GenericAPIView):
@@ -399,6 +573,97 @@ class CurrencyMasterViewSet(MasterGenericViewSet):
     http_method_names = ("get",)
 
 
+class CurrencyConvertView(generics.GenericAPIView):
+    """
+    Convert a list of {amount, from, to, at} items in one request.
+
+    Responses are cached by rate version and payload, so repeating a quote
+    costs a single cache read until a rate changes.
+    """
+
+    serializer_class = CurrencyConvertItemSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_cache_key(self, request):
+        rate_table.refresh()
+        version = rate_table.version
+        # Items without "at" use the current rates, which change when a
+        # future dated rate takes effect without a version bump.
+        _cross_rates, valid_until = rate_table.current_matrix(timezone.now())
+        valid_until = valid_until.timestamp() if valid_until else ""
+        payload = json.dumps(request.data, sort_keys=True, default=str)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"foundation:currency_convert:{version}:{valid_until}:{digest}"
+
+    def convert(self, items):
+        groups = defaultdict(list)
+        for index, item in enumerate(items):
+            groups[(item["from"], item.get("at"))].append(index)
+
+        converted = [None] * len(items)
+        for (currency_from, at), indexes in groups.items():
+            amounts = currency_convert_many(
+                [items[index]["amount"] for index in indexes],
+                currency_from,
+                [items[index]["to"] for index in indexes],
+                at=at,
+            )
+            for index, amount in zip(indexes, amounts):
+                converted[index] = amount
+        return converted
+
+    def post(self, request, *args, **kwargs):
+        cache_key = self.get_cache_key(request)
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data, status=status.HTTP_200_OK)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        converted = self.convert(serializer.validated_data)
+        data = {
+            "results": [
+                {**item, "converted": str(amount)}
+                for item, amount in zip(request.data, converted)
+            ]
+        }
+        cache.set(
+            cache_key,
+            data,
+            getattr(settings, "FOUNDATION_CURRENCY_CONVERT_CACHE_TIMEOUT", 300),
+        )
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class CurrencyRateHistoryView(generics.GenericAPIView):
+    """
+    Rate history of a currency pair bucketed by hour, day, week or month.
+
+    Query with ``?from=USD&to=EUR&interval=day&kind=ohlc``, optionally
+    bounded by ``start`` and ``end``. The result is a mapping of equal length
+    columns rather than one object per bucket.
+    """
+
+    serializer_class = CurrencyRateHistorySerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        columns = rate_history(
+            params["from"],
+            params["to"],
+            interval=params["interval"],
+            ohlc=params["kind"] == "ohlc",
+            start=params.get("start"),
+            end=params.get("end"),
+        )
+        return Response(columns, status=status.HTTP_200_OK)
+
+
 class MenuViewSet(MasterGenericViewSet):
     """
     A viewset for viewing menus instances.
@@ -408,6 +673,38 @@ class MenuViewSet(MasterGenericViewSet):
     serializer_class = MenuSerializer
     http_method_names = ("get",)
 
+    @action(detail=False, permission_classes=(AllowAny,))
+    def tree(self, request):
+        """
+        Return the menus visible to the current user as a nested tree.
+        """
+        tree = get_menu_tree(authenticated=request.user.is_authenticated)
+        return Response(with_absolute_icons(tree, request.build_absolute_uri))
+
+
+class MenuReorderView(generics.GenericAPIView):
+    """
+    Change the order and parent of many menus at once.
+
+    Accepts a list of {id, order, parent} objects. All changes are written
+    together and the menu tree is rebuilt once.
+    """
+
+    serializer_class = MenuOrderSerializer
+    # Menus are otherwise only editable in the admin
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            count = reorder_menus(serializer.validated_data)
+        except ValueError as err:
+            raise ValidationError({"detail": str(err)})
+
+        return Response({"changed": count}, status=status.HTTP_200_OK)
+
 
 class MenuActionViewSet(MasterGenericViewSet):
     """
@@ -426,12 +723,54 @@ class UserTypeSecurityViewSet(MasterGenericViewSet):
 
     model = UserType
     serializer_class = UserTypeSecuritySerializer
+    prefetch_related_fields = (
+        Prefetch(
+            "usertype_menu_set",
+            queryset=UserTypeMenuPermission.objects.select_related(
+                "menu__parent",
+                "created_by__user_type",
+                "updated_by__user_type",
+            ).prefetch_related(
+                *user_relation_prefetches("created_by__", nested=True),
+                *user_relation_prefetches("updated_by__", nested=True),
+                Prefetch(
+                    "menu_action",
+                    queryset=MenuAction.objects.select_related(
+                        "created_by", "updated_by"
+                    ).prefetch_related(
+                        *user_relation_prefetches("created_by__"),
+                        *user_relation_prefetches("updated_by__"),
+                    ),
+                ),
+            ),
+        ),
+    )
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
             return UserTypeNestedSecuritySerializer
+        if self.action == "bulk_permissions":
+            return BulkMenuPermissionSerializer
         return super().get_serializer_class()
 
+    @action(detail=True, methods=["post"])
+    def bulk_permissions(self, request, pk=None):
+        """
+        Grant and revoke menu actions of a user type in one transaction.
+        Returns the number of permission rows created and grants changed.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = bulk_update_user_type_permissions(
+            self.get_object(),
+            grant=serializer.validated_data["grant"],
+            revoke=serializer.validated_data["revoke"],
+            user=request.user,
+        )
+
+        return Response(result, status=status.HTTP_200_OK)
+
 
 class UserSecurityViewSet(MasterGenericViewSet):
     """
@@ -440,6 +779,22 @@ class UserSecurityViewSet(MasterGenericViewSet):
 
     model = UserMenuSecurity
     serializer_class = UserSecuritySerializer
+    prefetch_related_fields = (
+        Prefetch(
+            "users",
+            queryset=User.objects.prefetch_related(*user_relation_prefetches("")),
+        ),
+        Prefetch(
+            "users_menu_set",
+            queryset=UsersMenuPermission.objects.select_related(
+                "menu", "created_by", "updated_by"
+            ).prefetch_related(
+                "menu_action",
+                *user_relation_prefetches("created_by__"),
+                *user_relation_prefetches("updated_by__"),
+            ),
+        ),
+    )
 
     def get_serializer_class(self):
         if self.action in ["list", "retrieve"]:
@@ -452,46 +807,50 @@ class UserPermissionView(views.APIView):
     A view for viewing Users permissions.
     """
 
-    model = UsersMenuPermission
+    model = UserEffectivePermission
     permission_classes = (IsAuthenticated,)
 
-    def _get_user_menu_permissions(self):
-        # print(self.request.user.get_user_security)
-        queryset = UsersMenuPermission.objects.filter(
-            users_menu__users=self.request.user
-        )
-        serializer = UserPermissionSerializer(queryset, many=True)
-        return serializer.data
+    def get_etag(self, request):
+        """
+        Strong ETag built from the menu version and the user's permission
+        version, both bumped whenever the payload could change. None unless
+        the cache is shared, since other processes can't see the bumps.
+        """
+        if not cache_is_shared():
+            return None
 
-    def _get_usertype_menu_permissions(self):
-        queryset = UserTypeMenuPermission.objects.filter(
-            user_type__user=self.request.user
-        )
-        serializer = UserTypePermissionSerializer(queryset, many=True)
-        return serializer.data
+        version_key = permission_version_key(request.user.pk)
+        versions = get_versions([MENU_VERSION_KEY, version_key])
+        return f'"{versions[MENU_VERSION_KEY]}.{versions[version_key]}"'
 
     def get(self, request, format=None):
         """
         Return a list of all users permissions.
         """
-        menu_permissions = (
-            self._get_user_menu_permissions() + self._get_usertype_menu_permissions()
-        )
-
-        temp_ids, user_permission = [], []
-
-        for row in menu_permissions:
-            id = row["menu"]["id"]
-            if id not in temp_ids:
-                temp_ids.append(id)
-                user_permission.append(row)
-            else:
-                for index, perm in enumerate(user_permission):
-                    if id == perm["menu"]["id"]:
-                        merge_dict = mergedicts(row, perm)
-                        user_permission.remove(user_permission[index])
-                        user_permission.append(merge_dict)
-
-        ordered_permission = sorted(user_permission, key=lambda d: d["menu"]["order"])
+        etag = self.get_etag(request)
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+
+        if etag is not None and (etag in if_none_match or "*" in if_none_match):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            queryset = (
+                UserEffectivePermission.objects.filter(user=request.user)
+                .select_related("menu")
+                .order_by("menu__order", "menu_id")
+            )
+            actions = MenuAction.objects.all()
+            menu_actions = {
+                action.bit: data
+                for action, data in zip(
+                    actions, MenuActionSerializer(actions, many=True).data
+                )
+            }
+            serializer = UserEffectivePermissionSerializer(
+                queryset, many=True, context={"menu_actions": menu_actions}
+            )
+            response = Response(serializer.data)
 
-        return Response(ordered_permission)
+        if etag is not None:
+            response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -8,4 +8,5 @@ class FoundationConfig(AppConfig):
     verbose_name = _("Foundation")
 
     def ready(self):
+        import foundation.checks
         import foundation.signals
@@ -0,0 +1,24 @@
+from django.core.checks import Tags, Warning, register
+
+from foundation.utils.cache import cache_is_shared
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+
+    return [
+        Warning(
+            "The default cache is not shared between processes.",
+            hint=(
+                "foundation invalidates its per-process caches through the "
+                "default cache. Without a shared cache, e.g. Redis or "
+                "Memcached, security related lookups fall back to the "
+                "database and other cached data only follows changes made in "
+                "the same process. Set FOUNDATION_CACHE_IS_SHARED = True if "
+                "the project runs as a single process."
+            ),
+            id="foundation.W001",
+        )
+    ]
@@ -0,0 +1,64 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foundation.models import CurrencyRate
+from foundation.utils.converter import currency_convert, currency_convert_many
+
+
+class Command(BaseCommand):
+    help = "Time scalar against batch currency conversion on existing rates."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            action="append",
+            type=int,
+            dest="sizes",
+            help="Number of amounts to convert. Can be repeated.",
+        )
+        parser.add_argument(
+            "--numpy", action="store_true", help="Also time the numpy path."
+        )
+
+    def timed(self, label, size, func):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{label:>8} {size:>10}: {elapsed:.3f}s ({size / elapsed:,.0f} amounts/s)"
+        )
+        return result
+
+    def handle(self, *args, **options):
+        rate = CurrencyRate.objects.order_by("-effective_date").first()
+        if rate is None:
+            raise CommandError("Add at least one currency rate first.")
+
+        base, target = rate.currency_from_id, rate.currency_to_id
+        for size in options["sizes"] or [10_000, 1_000_000]:
+            amounts = [
+                Decimal(random.randint(1, 10_000_000)) / 100 for _ in range(size)
+            ]
+
+            scalar = self.timed(
+                "scalar",
+                size,
+                lambda: [currency_convert(amount, base, target) for amount in amounts],
+            )
+            batch = self.timed(
+                "batch", size, lambda: currency_convert_many(amounts, base, target)
+            )
+            if scalar != batch:
+                raise CommandError("Batch results differ from currency_convert.")
+
+            if options["numpy"]:
+                self.timed(
+                    "numpy",
+                    size,
+                    lambda: currency_convert_many(
+                        amounts, base, target, use_numpy=True
+                    ),
+                )
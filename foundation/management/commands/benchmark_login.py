@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from foundation.models import User
+
+EMAIL = "benchmark-login@example.com"
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Time logins through the login endpoint with a temporary user. "
+        "Changes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--logins", type=int, default=100, help="Number of logins to time."
+        )
+
+    def handle(self, *args, **options):
+        logins = options["logins"]
+        url = reverse("api.foundation:user_login")
+        data = {"email": EMAIL, "password": PASSWORD}
+
+        # Every login comes from the same address and email
+        with override_settings(
+            FOUNDATION_THROTTLE_RATES={"login_ip": None, "login_email": None},
+            ALLOWED_HOSTS=["testserver"],
+        ), transaction.atomic():
+            User.objects.create_user(EMAIL, PASSWORD)
+            client = APIClient()
+
+            queries = []
+            with connection.execute_wrapper(
+                lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)
+            ):
+                response = client.post(url, data, format="json")
+            if response.status_code != 200:
+                raise CommandError(f"Login failed with {response.status_code}.")
+
+            start = time.perf_counter()
+            for _login in range(logins):
+                client.post(url, data, format="json")
+            elapsed = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{logins} logins: {elapsed:.3f}s ({logins / elapsed:,.1f} logins/s, "
+            f"{len(queries)} queries each)"
+        )
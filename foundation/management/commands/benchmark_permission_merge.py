@@ -0,0 +1,115 @@
+import copy
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foundation.utils.permissions import mask_to_bits, merge_grants
+
+ACTIONS = 8
+
+
+def legacy_merge(menu_permissions):
+    """The list based merge UserPermissionView used before the bitmask table."""
+
+    def mergedicts(dict1, dict2):
+        d = dict1["menu_action"]
+        for k in dict2["menu_action"]:
+            if k not in dict1["menu_action"]:
+                d.append(k)
+        return {"menu": dict1["menu"], "menu_action": d}
+
+    temp_ids, user_permission = [], []
+    for row in menu_permissions:
+        id = row["menu"]["id"]
+        if id not in temp_ids:
+            temp_ids.append(id)
+            user_permission.append(row)
+        else:
+            for index, perm in enumerate(user_permission):
+                if id == perm["menu"]["id"]:
+                    merge_dict = mergedicts(row, perm)
+                    user_permission.remove(user_permission[index])
+                    user_permission.append(merge_dict)
+
+    return sorted(user_permission, key=lambda d: d["menu"]["order"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the old list based menu permission merge against merge_grants "
+        "on generated permissions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--menus",
+            action="append",
+            type=int,
+            dest="sizes",
+            help="Number of menus to merge. Can be repeated.",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Runs to take the best of."
+        )
+
+    def generate(self, size):
+        """Return the user and user type grants of ``size`` menus."""
+
+        grants = []
+        for _source in range(2):
+            for menu_id in range(1, size + 1):
+                action_ids = random.sample(
+                    range(1, ACTIONS + 1), random.randint(1, ACTIONS)
+                )
+                grants.append((menu_id, action_ids))
+        random.shuffle(grants)
+        return grants
+
+    def timed(self, label, size, repeat, func):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f"{label:>8} {size:>6} menus: {best * 1000:.3f}ms")
+        return result
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        for size in options["sizes"] or [10, 100, 1_000]:
+            grants = self.generate(size)
+            orders = {menu_id: random.randint(1, size) for menu_id in range(size + 1)}
+            rows = [
+                {
+                    "menu": {"id": menu_id, "order": orders[menu_id]},
+                    "menu_action": [{"id": action_id} for action_id in action_ids],
+                }
+                for menu_id, action_ids in grants
+            ]
+            mask_rows = [
+                (1, menu_id, sum(1 << (action_id - 1) for action_id in action_ids))
+                for menu_id, action_ids in grants
+            ]
+
+            # The old merge changes its rows, so each run gets its own copy
+            copies = iter([copy.deepcopy(rows) for _ in range(repeat)])
+            legacy = self.timed(
+                "legacy", size, repeat, lambda: legacy_merge(next(copies))
+            )
+            merged = self.timed(
+                "merge", size, repeat, lambda: merge_grants(mask_rows)[1]
+            )
+
+            expected = {
+                row["menu"]["id"]: sorted(action["id"] for action in row["menu_action"])
+                for row in legacy
+            }
+            actual = {
+                # Action n is given bit n - 1 in the generated masks
+                menu_id: [bit + 1 for bit in mask_to_bits(mask)]
+                for menu_id, mask in merged.items()
+            }
+            if expected != actual:
+                raise CommandError("merge_grants results differ from the old merge.")
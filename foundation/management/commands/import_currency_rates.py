@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foundation.utils.rates import import_currency_rates
+
+
+class Command(BaseCommand):
+    help = (
+        "Import currency rates from a CSV or NDJSON file with the columns "
+        "currency_from, currency_to, buy_rate, sell_rate and effective_date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "ndjson"], dest="file_format")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--user", type=int, dest="user_id", help="Id stamped as created_by."
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_false",
+            dest="use_copy",
+            help="Use bulk_create instead of COPY on PostgreSQL.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            count = import_currency_rates(
+                options["path"],
+                file_format=options["file_format"],
+                batch_size=options["batch_size"],
+                user_id=options["user_id"],
+                use_copy=options["use_copy"],
+            )
+        except (OSError, ValueError) as err:
+            raise CommandError(err)
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {count} rates in {elapsed:.2f}s "
+                f"({count / elapsed if elapsed else 0:,.0f} rows/sec)."
+            )
+        )
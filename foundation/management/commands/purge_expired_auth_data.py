@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from foundation.utils.housekeeping import purge_expired_auth_data
+
+
+class Command(BaseCommand):
+    help = "Delete expired OTPs and expired outstanding and blacklisted tokens."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = purge_expired_auth_data(batch_size=options["batch_size"])
+
+        for table, count in removed.items():
+            self.stdout.write(f"{table}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Removed {sum(removed.values())} expired rows.")
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from foundation.utils.permissions import (
+    rebuild_all_user_permissions,
+    rebuild_user_permissions,
+)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed effective menu permissions of users."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            action="append",
+            type=int,
+            dest="user_ids",
+            help="Only rebuild the given user id. Can be repeated.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options["user_ids"]:
+            count = rebuild_user_permissions(options["user_ids"])
+        else:
+            count = rebuild_all_user_permissions(batch_size=options["batch_size"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {count} effective permission rows.")
+        )
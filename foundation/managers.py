@@ -7,6 +7,12 @@ class CustomUserManager(BaseUserManager):
     for authentication instead of usernames.
     """
 
+    def get_by_natural_key(self, username):
+        # Login reads the authentication options and user type right after
+        return self.select_related("userauth", "user_type").get(
+            **{self.model.USERNAME_FIELD: username}
+        )
+
     def create_user(self, email, password, **extra_fields):
         if not email:
             raise ValueError("Users must have an email address")
@@ -0,0 +1,170 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_action_bits(apps, schema_editor):
+    MenuAction = apps.get_model("foundation", "MenuAction")
+
+    action_ids = list(MenuAction.objects.order_by("id").values_list("id", flat=True))
+    if len(action_ids) > 63:
+        raise RuntimeError(
+            f"Permission masks hold 63 menu actions, found {len(action_ids)}. "
+            "Delete unused menu actions and migrate again."
+        )
+    for bit, action_id in enumerate(action_ids):
+        MenuAction.objects.filter(id=action_id).update(bit=bit)
+
+
+def populate_action_masks(apps, schema_editor):
+    UserEffectivePermission = apps.get_model("foundation", "UserEffectivePermission")
+    UserTypeMenuPermission = apps.get_model("foundation", "UserTypeMenuPermission")
+    UsersMenuPermission = apps.get_model("foundation", "UsersMenuPermission")
+
+    for model in (UserTypeMenuPermission, UsersMenuPermission):
+        masks = {}
+        for pk, bit in model.objects.values_list("pk", "menu_action__bit").iterator():
+            mask = masks.get(pk, 0)
+            if bit is not None:
+                mask |= 1 << bit
+            masks[pk] = mask
+
+        for pk, mask in masks.items():
+            if mask:
+                model.objects.filter(pk=pk).update(action_mask=mask)
+
+    grants = {}
+    for rows in (
+        UserTypeMenuPermission.objects.filter(user_type__user__isnull=False)
+        .values_list("user_type__user", "menu_id", "action_mask")
+        .iterator(),
+        UsersMenuPermission.objects.filter(users_menu__users__isnull=False)
+        .values_list("users_menu__users", "menu_id", "action_mask")
+        .iterator(),
+    ):
+        for user_id, menu_id, action_mask in rows:
+            grants[(user_id, menu_id)] = grants.get((user_id, menu_id), 0) | action_mask
+
+    UserEffectivePermission.objects.bulk_create(
+        [
+            UserEffectivePermission(
+                user_id=user_id, menu_id=menu_id, action_mask=action_mask
+            )
+            for (user_id, menu_id), action_mask in grants.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "foundation",
+            "0004_currencymaster_created_at_currencymaster_created_by_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="menuaction",
+            name="bit",
+            field=models.PositiveSmallIntegerField(
+                editable=False,
+                null=True,
+                unique=True,
+                verbose_name="Mask bit",
+            ),
+        ),
+        migrations.RunPython(assign_action_bits, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="menuaction",
+            name="bit",
+            field=models.PositiveSmallIntegerField(
+                editable=False,
+                help_text="Position of the action in permission action masks.",
+                unique=True,
+                verbose_name="Mask bit",
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="language",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("en", "English"),
+                    ("fr", "French"),
+                    ("de", "German"),
+                    ("it", "Italian"),
+                ],
+                default="English",
+                max_length=150,
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="UserEffectivePermission",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "menu",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="foundation.menu",
+                        verbose_name="Menu",
+                    ),
+                ),
+                (
+                    "action_mask",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Action mask"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effective_permission_set",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "User Effective Permission",
+                "verbose_name_plural": "User Effective Permission",
+                "unique_together": {("user", "menu")},
+            },
+        ),
+        migrations.AddField(
+            model_name="usersmenupermission",
+            name="action_mask",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Bitmask of the selected menu actions.",
+                verbose_name="Action mask",
+            ),
+        ),
+        migrations.AddField(
+            model_name="usertypemenupermission",
+            name="action_mask",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Bitmask of the selected menu actions.",
+                verbose_name="Action mask",
+            ),
+        ),
+        migrations.RunPython(populate_action_masks, migrations.RunPython.noop),
+    ]
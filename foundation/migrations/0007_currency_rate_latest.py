@@ -0,0 +1,115 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def populate_latest_rates(apps, schema_editor):
+    CurrencyRate = apps.get_model("foundation", "CurrencyRate")
+    CurrencyRateLatest = apps.get_model("foundation", "CurrencyRateLatest")
+
+    latest = {}
+    for rate in (
+        CurrencyRate.objects.filter(effective_date__lte=timezone.now())
+        .order_by("effective_date", "id")
+        .iterator()
+    ):
+        latest[(rate.currency_from_id, rate.currency_to_id)] = rate
+
+    CurrencyRateLatest.objects.bulk_create(
+        [
+            CurrencyRateLatest(
+                currency_from_id=rate.currency_from_id,
+                currency_to_id=rate.currency_to_id,
+                rate=rate,
+                buy_rate=rate.buy_rate,
+                sell_rate=rate.sell_rate,
+                effective_date=rate.effective_date,
+            )
+            for rate in latest.values()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foundation", "0005_usereffectivepermission"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CurrencyRateLatest",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "buy_rate",
+                    models.DecimalField(
+                        decimal_places=4, max_digits=10, verbose_name="Buy Rate"
+                    ),
+                ),
+                (
+                    "sell_rate",
+                    models.DecimalField(
+                        decimal_places=4, max_digits=10, verbose_name="Sell Rate"
+                    ),
+                ),
+                ("effective_date", models.DateTimeField(verbose_name="Effective Date")),
+            ],
+            options={
+                "verbose_name": "Latest Currency Rate",
+                "verbose_name_plural": "Latest Currency Rate",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="currencyrate",
+            index=models.Index(
+                fields=["currency_from", "currency_to", "effective_date"],
+                name="currency_rate_pair_date_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="currencyratelatest",
+            name="currency_from",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="latest_rate_from_set",
+                to="foundation.currencymaster",
+                verbose_name="Currency From",
+            ),
+        ),
+        migrations.AddField(
+            model_name="currencyratelatest",
+            name="currency_to",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="latest_rate_to_set",
+                to="foundation.currencymaster",
+                verbose_name="Currency To",
+            ),
+        ),
+        migrations.AddField(
+            model_name="currencyratelatest",
+            name="rate",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="latest",
+                to="foundation.currencyrate",
+                verbose_name="Rate",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="currencyratelatest",
+            unique_together={("currency_from", "currency_to")},
+        ),
+        migrations.RunPython(populate_latest_rates, migrations.RunPython.noop),
+    ]
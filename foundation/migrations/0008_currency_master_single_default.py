@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:49
+
+from django.db import migrations, models
+
+
+def keep_single_default(apps, schema_editor):
+    CurrencyMaster = apps.get_model("foundation", "CurrencyMaster")
+    defaults = CurrencyMaster.objects.filter(default=True).order_by("id")
+    first = defaults.first()
+    if first is not None:
+        defaults.exclude(pk=first.pk).update(default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foundation", "0007_currency_rate_latest"),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_single_default, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="currencymaster",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("default", True)),
+                fields=("default",),
+                name="currency_master_single_default",
+                violation_error_message="One default currency already exists.",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foundation", "0008_currency_master_single_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OneTimePassword",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("purpose", models.CharField(max_length=20, verbose_name="Purpose")),
+                (
+                    "code_hash",
+                    models.CharField(max_length=128, verbose_name="Code hash"),
+                ),
+                ("expires_at", models.DateTimeField(verbose_name="Expires At")),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Attempts"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="otp_set",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="User",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "One Time Password",
+                "verbose_name_plural": "One Time Password",
+                "indexes": [
+                    models.Index(fields=["expires_at"], name="otp_expires_at_idx")
+                ],
+                "unique_together": {("user", "purpose")},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("foundation", "0009_one_time_password"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="currencyrate",
+            index=models.Index(
+                fields=["effective_date"], name="currency_rate_date_idx"
+            ),
+        ),
+    ]
@@ -14,6 +14,14 @@ from phonenumber_field.modelfields import PhoneNumberField
 
 from foundation.managers import CustomUserManager
 from foundation.utils.base import get_current_user
+from foundation.utils.cache import (
+    CURRENCY_VERSION_KEY,
+    LRUCache,
+    cache_is_shared,
+    get_version,
+)
+
+_default_currency = LRUCache(maxsize=1)
 
 
 class BaseModel(models.Model):
@@ -61,24 +69,45 @@ class CurrencyMaster(BaseModel):
         verbose_name = _("Currency Master")
         verbose_name_plural = _("Currency Master")
         ordering = ("id",)
-
-    def validate_unique(self, *args, **kwargs):
-        super().validate_unique(*args, **kwargs)
-        if (
-            self.default
-            and self.__class__.objects.exclude(id=self.id).filter(default=True).exists()
-        ):
-            raise ValidationError(
-                message="One default currency already exists.",
-                code="unique",
-            )
+        constraints = [
+            models.UniqueConstraint(
+                fields=["default"],
+                condition=models.Q(default=True),
+                name="currency_master_single_default",
+                violation_error_message="One default currency already exists.",
+            ),
+        ]
 
     @classmethod
     def get_default_pk(cls):
-        try:
-            return cls.objects.get(default=True).pk
-        except cls.DoesNotExist:
-            return ""
+        """
+        Return the pk of the default currency, or "" when there is none.
+        With a shared cache it is held per process until a currency is saved
+        or deleted, otherwise it is read from the database every time.
+        """
+
+        if not cache_is_shared():
+            return cls._load_default_pk()
+
+        version = get_version(CURRENCY_VERSION_KEY)
+        entry = _default_currency.get(CURRENCY_VERSION_KEY)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        pk = cls._load_default_pk()
+        _default_currency.set(CURRENCY_VERSION_KEY, (version, pk))
+        return pk
+
+    @classmethod
+    def _load_default_pk(cls):
+        pk = cls.objects.filter(default=True).values_list("pk", flat=True).first()
+        return "" if pk is None else pk
+
+    @staticmethod
+    def clear_default_pk():
+        """Forget the default currency held by this process."""
+
+        _default_currency.clear()
 
 
 class UserType(BaseModel):
@@ -172,6 +201,31 @@ class UserAuthenticationOption(models.Model):
         return super().clean()
 
 
+class OneTimePassword(models.Model):
+    """
+    A hashed one time password of a user for a purpose such as login.
+    See ``foundation.utils.otp``.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name=_("User"), related_name="otp_set"
+    )
+    purpose = models.CharField(max_length=20, verbose_name=_("Purpose"))
+    code_hash = models.CharField(max_length=128, verbose_name=_("Code hash"))
+    expires_at = models.DateTimeField(verbose_name=_("Expires At"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Attempts"))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.user} - {self.purpose}"
+
+    class Meta:
+        unique_together = ("user", "purpose")
+        indexes = [models.Index(fields=["expires_at"], name="otp_expires_at_idx")]
+        verbose_name = _("One Time Password")
+        verbose_name_plural = _("One Time Password")
+
+
 class CurrencyRate(BaseModel):
     currency_from = models.ForeignKey(
         CurrencyMaster,
@@ -207,10 +261,59 @@ class CurrencyRate(BaseModel):
     class Meta:
         ordering = ("effective_date",)
         get_latest_by = ("effective_date",)
+        indexes = [
+            models.Index(
+                fields=["currency_from", "currency_to", "effective_date"],
+                name="currency_rate_pair_date_idx",
+            ),
+            models.Index(fields=["effective_date"], name="currency_rate_date_idx"),
+        ]
         verbose_name = _("Currency Rate")
         verbose_name_plural = _("Currency Rate")
 
 
+class CurrencyRateLatest(models.Model):
+    """
+    The rate currently in effect for each currency pair.
+    Rows are maintained from signals and a periodic task, see
+    ``foundation.utils.rates``.
+    """
+
+    currency_from = models.ForeignKey(
+        CurrencyMaster,
+        on_delete=models.CASCADE,
+        verbose_name=_("Currency From"),
+        related_name="latest_rate_from_set",
+    )
+    currency_to = models.ForeignKey(
+        CurrencyMaster,
+        on_delete=models.CASCADE,
+        verbose_name=_("Currency To"),
+        related_name="latest_rate_to_set",
+    )
+    rate = models.OneToOneField(
+        CurrencyRate,
+        on_delete=models.CASCADE,
+        verbose_name=_("Rate"),
+        related_name="latest",
+    )
+    buy_rate = models.DecimalField(
+        max_digits=10, decimal_places=4, verbose_name=_("Buy Rate")
+    )
+    sell_rate = models.DecimalField(
+        max_digits=10, decimal_places=4, verbose_name=_("Sell Rate")
+    )
+    effective_date = models.DateTimeField(verbose_name=_("Effective Date"))
+
+    def __str__(self) -> str:
+        return f"{self.currency_from} - {self.currency_to}"
+
+    class Meta:
+        unique_together = ("currency_from", "currency_to")
+        verbose_name = _("Latest Currency Rate")
+        verbose_name_plural = _("Latest Currency Rate")
+
+
 class Menu(MPTTModel, BaseModel):
     name = models.CharField(max_length=50, verbose_name=_("Name"), unique=True)
     slug = models.SlugField(max_length=100, verbose_name=_("Slug"), editable=False)
@@ -242,9 +345,23 @@ class Menu(MPTTModel, BaseModel):
         verbose_name = _("Menu")
         verbose_name_plural = _("Menu")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
+
     def save(self, *args, **kwargs):
-        self.slug = slugify(self.name)
-        return super().save(*args, **kwargs)
+        # Only re-slugify when the name changed since it was loaded
+        if not self.slug or self.name != getattr(self, "_loaded_name", None):
+            self.slug = slugify(self.name)
+        result = super().save(*args, **kwargs)
+        self._loaded_name = self.name
+        return result
+
+
+# Permission action masks are 64 bit signed integer columns
+MENU_ACTION_BITS = 63
 
 
 class MenuAction(BaseModel):
@@ -260,9 +377,46 @@ class MenuAction(BaseModel):
         help_text=_("Use for HTML class name."),
     )
 
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        editable=False,
+        verbose_name=_("Mask bit"),
+        help_text=_("Position of the action in permission action masks."),
+    )
+
     def __str__(self) -> str:
         return self.action
 
+    @classmethod
+    def free_bit(cls):
+        """Return the lowest bit no action uses, or None when all are taken."""
+
+        used = set(cls.objects.values_list("bit", flat=True))
+        return next((bit for bit in range(MENU_ACTION_BITS) if bit not in used), None)
+
+    def clean(self) -> None:
+        if self.bit is None and self.free_bit() is None:
+            raise ValidationError(
+                _("There can't be more than %(count)d menu actions.")
+                % {"count": MENU_ACTION_BITS}
+            )
+
+        return super().clean()
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.free_bit()
+            if self.bit is None:
+                raise ValidationError(
+                    _("There can't be more than %(count)d menu actions.")
+                    % {"count": MENU_ACTION_BITS}
+                )
+        super().save(*args, **kwargs)
+
+    @property
+    def mask(self) -> int:
+        return 1 << self.bit
+
     class Meta:
         ordering = ("id",)
         verbose_name = _("Menu Action")
@@ -284,6 +438,12 @@ class UserTypeMenuPermission(BaseModel):
         related_name="user_type_menu_action_set",
         verbose_name=_("Select menu actions"),
     )
+    action_mask = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Action mask"),
+        help_text=_("Bitmask of the selected menu actions."),
+    )
 
     def __str__(self) -> str:
         return f"{self.user_type} - {self.menu}"
@@ -322,6 +482,12 @@ class UsersMenuPermission(BaseModel):
         related_name="user_menu_action_set",
         verbose_name=_("Select menu actions"),
     )
+    action_mask = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("Action mask"),
+        help_text=_("Bitmask of the selected menu actions."),
+    )
 
     # def __str__(self) -> str:
     #     return f"{self.user} - {self.menu}"
@@ -330,3 +496,29 @@ class UsersMenuPermission(BaseModel):
         ordering = ("-id",)
         verbose_name = _("Users Menu Permission")
         verbose_name_plural = _("Users Menu Permission")
+
+
+class UserEffectivePermission(models.Model):
+    """
+    Precomputed union of a user's type and user level menu permissions.
+    Rows are maintained from signals, see ``foundation.utils.permissions``.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=_("User"),
+        related_name="effective_permission_set",
+    )
+    menu = models.ForeignKey(Menu, on_delete=models.CASCADE, verbose_name=_("Menu"))
+    action_mask = models.PositiveBigIntegerField(
+        default=0, verbose_name=_("Action mask")
+    )
+
+    def __str__(self) -> str:
+        return f"{self.user} - {self.menu}"
+
+    class Meta:
+        unique_together = ("user", "menu")
+        verbose_name = _("User Effective Permission")
+        verbose_name_plural = _("User Effective Permission")
@@ -1,13 +1,51 @@
 from allauth.socialaccount.models import SocialAccount
-from django.db.models.signals import post_save
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
 from django.conf import settings
+from django.db import transaction
 from django.dispatch import receiver
 
-from foundation.models import User
+from foundation.api.utils import warm_anonymous_menus
+from foundation.models import (
+    CurrencyMaster,
+    CurrencyRate,
+    Menu,
+    MenuAction,
+    User,
+    UserMenuSecurity,
+    UsersMenuPermission,
+    UserType,
+    UserTypeMenuPermission,
+)
+from foundation.utils.blacklist import blacklist_changed
+from foundation.utils.cache import (
+    CURRENCY_VERSION_KEY,
+    MENU_VERSION_KEY,
+    bump_version,
+)
+from foundation.utils.converter import rate_inserted, rates_changed
 from foundation.utils.notifications import welcome_email_notification
+from foundation.utils.permissions import (
+    permissions_of_menu_action,
+    refresh_action_masks,
+    schedule_permission_rebuild,
+    users_of_permissions,
+    users_of_menu_security,
+    users_of_user_type,
+)
+from foundation.utils.rates import refresh_latest_rates
 from constance.signals import config_updated
+from functools import partial
 import os
 
+UNKNOWN = object()
+
 
 @receiver(config_updated)
 def constance_updated(sender, key, old_value, new_value, **kwargs):
@@ -28,3 +66,151 @@ def send_email_notification(sender, instance, created, **kwargs):
         user.save()
         # Send welcome mail
         welcome_email_notification(user)
+
+
+# Keep UserEffectivePermission in sync with the permission models
+@receiver(post_save, sender=UserTypeMenuPermission)
+@receiver(post_delete, sender=UserTypeMenuPermission)
+def user_type_permission_changed(sender, instance, **kwargs):
+    schedule_permission_rebuild(users_of_user_type(instance.user_type_id))
+
+
+@receiver(post_save, sender=UsersMenuPermission)
+@receiver(post_delete, sender=UsersMenuPermission)
+def users_permission_changed(sender, instance, **kwargs):
+    schedule_permission_rebuild(users_of_menu_security(instance.users_menu_id))
+
+
+def _permission_actions_changed(model, instance, action, reverse, pk_set):
+    if reverse:
+        # instance is a MenuAction, pk_set holds permission ids
+        if action == "pre_clear":
+            instance._cleared_permission_ids = list(
+                permissions_of_menu_action(model, instance.pk)
+            )
+            return
+        if action == "post_clear":
+            pk_set = instance.__dict__.pop("_cleared_permission_ids", ())
+        elif action not in ("post_add", "post_remove"):
+            return
+        refresh_action_masks(model, pk_set)
+        user_ids = users_of_permissions(model, pk_set)
+    else:
+        if action not in ("post_add", "post_remove", "post_clear"):
+            return
+        masks = refresh_action_masks(model, [instance.pk])
+        instance.action_mask = masks[instance.pk]
+        user_ids = users_of_permissions(model, [instance.pk])
+
+    schedule_permission_rebuild(user_ids)
+
+
+@receiver(m2m_changed, sender=UserTypeMenuPermission.menu_action.through)
+def user_type_permission_actions_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    _permission_actions_changed(
+        UserTypeMenuPermission, instance, action, reverse, pk_set
+    )
+
+
+@receiver(m2m_changed, sender=UsersMenuPermission.menu_action.through)
+def users_permission_actions_changed(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    _permission_actions_changed(UsersMenuPermission, instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=UserMenuSecurity.users.through)
+def menu_security_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # instance is a User
+        if action in ("post_add", "post_remove", "pre_clear"):
+            schedule_permission_rebuild([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        schedule_permission_rebuild(pk_set or ())
+    elif action == "pre_clear":
+        schedule_permission_rebuild(users_of_menu_security(instance.pk))
+
+
+@receiver(post_init, sender=User)
+def remember_user_type(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred user_type is not fetched here
+    instance._loaded_user_type_id = instance.__dict__.get("user_type_id", UNKNOWN)
+
+
+@receiver(post_save, sender=User)
+def user_type_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and "user_type" not in update_fields:
+        return
+
+    loaded_user_type_id = getattr(instance, "_loaded_user_type_id", UNKNOWN)
+    if (created and instance.user_type_id) or (
+        not created and loaded_user_type_id != instance.user_type_id
+    ):
+        schedule_permission_rebuild([instance.pk])
+    instance._loaded_user_type_id = instance.user_type_id
+
+
+@receiver(pre_delete, sender=UserType)
+def user_type_deleted(sender, instance, **kwargs):
+    # Users are detached with SET_NULL before the cascade reaches the
+    # permission rows, so collect them while the link still exists.
+    schedule_permission_rebuild(users_of_user_type(instance.pk))
+
+
+@receiver(pre_delete, sender=MenuAction)
+def remember_menu_action_permissions(sender, instance, **kwargs):
+    # The cascade to the through tables does not send m2m_changed
+    instance._permission_ids = {
+        model: list(permissions_of_menu_action(model, instance.pk))
+        for model in (UserTypeMenuPermission, UsersMenuPermission)
+    }
+
+
+@receiver(post_delete, sender=MenuAction)
+def menu_action_deleted(sender, instance, **kwargs):
+    for model, pks in instance.__dict__.pop("_permission_ids", {}).items():
+        if pks:
+            refresh_action_masks(model, pks)
+            schedule_permission_rebuild(users_of_permissions(model, pks))
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+@receiver(post_save, sender=MenuAction)
+@receiver(post_delete, sender=MenuAction)
+def menu_changed(sender, instance, **kwargs):
+    bump_version(MENU_VERSION_KEY)
+    if sender is Menu:
+        # Warm the pre-rendered anonymous menu instead of the next visitor
+        transaction.on_commit(warm_anonymous_menus)
+
+
+@receiver(post_save, sender=CurrencyRate)
+@receiver(post_delete, sender=CurrencyRate)
+def currency_rate_changed(sender, instance, created=False, **kwargs):
+    refresh_latest_rates([(instance.currency_from_id, instance.currency_to_id)])
+    if created:
+        transaction.on_commit(partial(rate_inserted, instance.pk))
+    else:
+        transaction.on_commit(rates_changed)
+
+
+@receiver(post_save, sender=CurrencyMaster)
+@receiver(post_delete, sender=CurrencyMaster)
+def currency_changed(sender, instance, **kwargs):
+    # Forget the old default right away, this process may read it again
+    # before the transaction commits or if it is rolled back
+    CurrencyMaster.clear_default_pk()
+    bump_version(CURRENCY_VERSION_KEY)
+    # and again once the change is visible to the other processes
+    transaction.on_commit(lambda: bump_version(CURRENCY_VERSION_KEY))
+    # Routes go through the default currency
+    transaction.on_commit(rates_changed)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def token_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(blacklist_changed)
@@ -0,0 +1,19 @@
+from celery import shared_task
+
+from foundation.utils.housekeeping import purge_expired_auth_data
+from foundation.utils.rates import import_currency_rates, promote_latest_rates
+
+
+@shared_task(serializer="json")
+def promote_latest_currency_rates():
+    return promote_latest_rates()
+
+
+@shared_task(serializer="json")
+def import_currency_rates_file(path, file_format=None, user_id=None):
+    return import_currency_rates(path, file_format=file_format, user_id=user_id)
+
+
+@shared_task(serializer="json")
+def clear_expired_auth_data():
+    return purge_expired_auth_data()
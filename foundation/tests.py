@@ -1,3 +1,109 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from foundation.models import (
+    CurrencyMaster,
+    Menu,
+    MenuAction,
+    User,
+    UserMenuSecurity,
+    UsersMenuPermission,
+    UserType,
+    UserTypeMenuPermission,
+)
+
+
+class SecurityViewSetQueryTests(TestCase):
+    """Listing security settings takes the same queries however many rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin@example.com", "password")
+        cls.menus = [Menu.objects.create(name=f"Menu {i}", order=i) for i in range(3)]
+        cls.actions = list(MenuAction.objects.all())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_user_type(self, number):
+        user_type = UserType.objects.create(name=f"Type {number}")
+        User.objects.create_user(
+            f"type{number}@example.com", "password", user_type=user_type
+        )
+        for menu in self.menus:
+            permission = UserTypeMenuPermission.objects.create(
+                user_type=user_type,
+                menu=menu,
+                created_by=self.admin,
+                updated_by=self.admin,
+            )
+            permission.menu_action.set(self.actions)
+
+    def add_user_security(self, number):
+        security = UserMenuSecurity.objects.create()
+        security.users.add(
+            User.objects.create_user(f"security{number}@example.com", "password"),
+            self.admin,
+        )
+        for menu in self.menus:
+            permission = UsersMenuPermission.objects.create(
+                users_menu=security,
+                menu=menu,
+                created_by=self.admin,
+                updated_by=self.admin,
+            )
+            permission.menu_action.set(self.actions)
+
+    def assertConstantQueries(self, url, add_row):
+        add_row(0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        for number in range(1, 5):
+            add_row(number)
+        with self.assertNumQueries(len(queries)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_user_type_security_list(self):
+        self.assertConstantQueries(
+            reverse("api.foundation:user_type_security-list"), self.add_user_type
+        )
+
+    def test_user_security_list(self):
+        self.assertConstantQueries(
+            reverse("api.foundation:user_security-list"), self.add_user_security
+        )
+
+
+class LoginQueryTests(TestCase):
+    def test_login_queries(self):
+        user_type = UserType.objects.create(name="Staff")
+        User.objects.create_user("login@example.com", "password", user_type=user_type)
+
+        # Loading the user joined with its type and auth options, then
+        # recording the refresh token in token_blacklist_outstandingtoken
+        with self.assertNumQueries(2):
+            response = APIClient().post(
+                reverse("api.foundation:user_login"),
+                {"email": "login@example.com", "password": "password"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(FOUNDATION_CACHE_IS_SHARED=True)
+class DefaultCurrencyTests(TestCase):
+    def test_default_currency_change_before_commit(self):
+        self.assertEqual(CurrencyMaster.get_default_pk(), "")
+
+        currency = CurrencyMaster.objects.create(
+            currency_code="EUR", currency_name="Euro", default=True
+        )
+        self.assertEqual(CurrencyMaster.get_default_pk(), currency.pk)
+
+        currency.delete()
+        self.assertEqual(CurrencyMaster.get_default_pk(), "")
@@ -0,0 +1,128 @@
+import hashlib
+import math
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from foundation.utils.cache import bump_version, get_version
+
+BLACKLIST_VERSION_KEY = "foundation:token_blacklist_version"
+
+
+class BloomFilter:
+    """
+    A fixed size set of strings answering "maybe present" or "surely absent"
+    with a false positive rate of ``error_rate`` up to ``capacity`` items.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for index in range(self.hashes):
+            yield (first + index * second) % self.size
+
+    def add(self, value) -> None:
+        for index in self._indexes(value):
+            self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+
+    def __contains__(self, value) -> bool:
+        return all(
+            self.bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(value)
+        )
+
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter over the jti of every blacklisted token, so the
+    database is only asked about tokens that may be blacklisted.
+
+    Each check compares a shared version in the Django cache, which is
+    bumped whenever a token is blacklisted, and then loads only the rows
+    blacklisted since the last load. Rows blacklisted up to ``overlap``
+    before the latest one loaded are read again, to catch transactions that
+    committed late; only rows not seen before are added, so the filter's
+    count stays the number of tokens.
+
+    Other processes only see the bump when the cache is shared, see
+    ``cache_is_shared``.
+    """
+
+    def __init__(self):
+        self.bloom = None
+        self.last_at = None
+        self.recent = {}
+        self.version = None
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return getattr(settings, "FOUNDATION_BLACKLIST_FILTER_CAPACITY", 100_000)
+
+    @property
+    def overlap(self):
+        return timedelta(
+            seconds=getattr(settings, "FOUNDATION_BLACKLIST_FILTER_OVERLAP", 300)
+        )
+
+    def load(self, since=None):
+        tokens = BlacklistedToken.objects.all()
+        if since is not None:
+            tokens = tokens.filter(blacklisted_at__gte=since)
+        return tokens.values_list("id", "blacklisted_at", "token__jti")
+
+    def refresh(self) -> None:
+        version = get_version(BLACKLIST_VERSION_KEY)
+        if version == self.version:
+            return
+
+        with self._lock:
+            if version == self.version:
+                return
+
+            if self.bloom is None:
+                rows = list(self.load())
+            else:
+                since = None if self.last_at is None else self.last_at - self.overlap
+                rows = [row for row in self.load(since) if row[0] not in self.recent]
+
+            if self.bloom is None or self.bloom.count + len(rows) > self.bloom.capacity:
+                if self.bloom is not None:
+                    rows = list(self.load())
+                self.bloom = BloomFilter(max(self.capacity, 2 * len(rows)))
+                self.recent = {}
+
+            for token_id, blacklisted_at, jti in rows:
+                self.bloom.add(jti)
+                self.recent[token_id] = blacklisted_at
+                if self.last_at is None or blacklisted_at > self.last_at:
+                    self.last_at = blacklisted_at
+
+            if self.last_at is not None:
+                self.recent = {
+                    token_id: blacklisted_at
+                    for token_id, blacklisted_at in self.recent.items()
+                    if blacklisted_at >= self.last_at - self.overlap
+                }
+            self.version = version
+
+    def might_contain(self, jti) -> bool:
+        self.refresh()
+        return jti in self.bloom
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def blacklist_changed() -> None:
+    bump_version(BLACKLIST_VERSION_KEY)
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+MENU_VERSION_KEY = "foundation:menu_version"
+CURRENCY_VERSION_KEY = "foundation:currency_version"
+CURRENCY_RATE_VERSION_KEY = "foundation:currency_rate_version"
+
+
+# Backends whose entries other processes can't see
+PER_PROCESS_CACHE_BACKENDS = (
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+
+def cache_is_shared() -> bool:
+    """
+    Return whether the default cache is shared by every process, so a
+    version bumped in one process invalidates the copies of all others.
+    ``FOUNDATION_CACHE_IS_SHARED`` overrides the guess from the backend,
+    e.g. for single process deployments.
+    """
+
+    shared = getattr(settings, "FOUNDATION_CACHE_IS_SHARED", None)
+    if shared is not None:
+        return shared
+
+    backend = settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get("BACKEND", "")
+    return backend not in PER_PROCESS_CACHE_BACKENDS
+
+
+def permission_version_key(user_id) -> str:
+    return f"foundation:permission_version:{user_id}"
+
+
+def get_versions(keys):
+    """
+    Return ``{key: version}`` for the given version keys.
+
+    Versions are random tokens shared through the Django cache. A key that is
+    missing (never set or evicted) gets a fresh token, so anything computed
+    against the old token is treated as stale.
+    """
+
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = uuid4().hex
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return versions
+
+
+def get_version(key) -> str:
+    return get_versions([key])[key]
+
+
+def bump_version(*keys):
+    """
+    Invalidate everything computed against the given version keys.
+    Returns ``{key: new version}``.
+    """
+
+    versions = {key: uuid4().hex for key in keys}
+    cache.set_many(versions, timeout=None)
+    return versions
+
+
+class LRUCache:
+    """
+    A small thread safe, per-process least recently used mapping.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
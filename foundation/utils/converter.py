@@ -1,28 +1,373 @@
-from datetime import datetime
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict, deque
+from uuid import uuid4
 
-from foundation.models import CurrencyRate
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 
+from foundation.models import CurrencyMaster, CurrencyRate
+from foundation.utils.cache import CURRENCY_RATE_VERSION_KEY, get_version
 
-def currency_convert(amount, base_currency, to_currency):
-    if base_currency != to_currency:
-        try:
-            rate_objs = CurrencyRate.objects.filter(
-                currency_from=base_currency,
-                currency_to=to_currency,
-                effective_date__lte=datetime.now(),
-            )
-            if rate_obj := rate_objs.latest():
-                amount = rate_obj.buy_rate * amount
-        except CurrencyRate.DoesNotExist:
-            pass
-        except:
-            # reverse
-            rate_objs = CurrencyRate.objects.filter(
-                currency_from=to_currency,
-                currency_to=base_currency,
-                effective_date__lte=datetime.now(),
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+class RateTable:
+    """
+    Per-process copy of CurrencyRate holding, for every (from, to) pair, the
+    effective dates in ascending order next to their buy rates, so the rate
+    in effect at a given time is a bisect instead of a query.
+
+    Currencies without a rate between them are converted along a route in
+    the rate graph: through the default currency when it links both, else
+    the shortest path. Current rates of every route are kept in a cross rate
+    matrix that stays valid until the next future dated rate takes effect.
+
+    The shared rate version is checked at most once every
+    ``FOUNDATION_CURRENCY_RATE_CHECK_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        self.pairs = {}
+        self.default = None
+        self.routes = {}
+        self.edge_routes = {}
+        self.matrix = None
+        self.version = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def check_interval(self):
+        return getattr(settings, "FOUNDATION_CURRENCY_RATE_CHECK_INTERVAL", 1.0)
+
+    def invalidate(self) -> None:
+        self.version = None
+
+    def load(self):
+        pairs = {}
+        for (
+            currency_from,
+            currency_to,
+            effective_date,
+            buy_rate,
+        ) in CurrencyRate.objects.order_by("effective_date", "id").values_list(
+            "currency_from_id", "currency_to_id", "effective_date", "buy_rate"
+        ):
+            dates, rates = pairs.setdefault((currency_from, currency_to), ([], []))
+            dates.append(effective_date)
+            rates.append(buy_rate)
+
+        default = (
+            CurrencyMaster.objects.filter(default=True)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        return pairs, default
+
+    def refresh(self) -> None:
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < self.check_interval:
+            return
+
+        with self._lock:
+            version = get_version(CURRENCY_RATE_VERSION_KEY)
+            if version != self.version:
+                self.pairs, self.default = self.load()
+                self.find_routes()
+                self.version = version
+            self.checked_at = now
+
+    def find_routes(self) -> None:
+        """
+        Compute the route between every two connected currencies and, for
+        every rate pair, the routes going through it. Clears the matrix.
+        """
+
+        graph = defaultdict(set)
+        for currency_from, currency_to in self.pairs:
+            graph[currency_from].add(currency_to)
+            graph[currency_to].add(currency_from)
+
+        default_links = graph.get(self.default, ())
+        routes = {}
+        for source in graph:
+            previous = {source: None}
+            queue = deque([source])
+            while queue:
+                node = queue.popleft()
+                for neighbour in graph[node]:
+                    if neighbour not in previous:
+                        previous[neighbour] = node
+                        queue.append(neighbour)
+
+            for target in previous:
+                if target == source:
+                    continue
+                if target in graph[source]:
+                    route = (source, target)
+                elif source in default_links and target in default_links:
+                    route = (source, self.default, target)
+                else:
+                    route = [target]
+                    while route[-1] != source:
+                        route.append(previous[route[-1]])
+                    route = tuple(reversed(route))
+                routes[(source, target)] = route
+
+        edge_routes = defaultdict(set)
+        for key, route in routes.items():
+            for edge in zip(route, route[1:]):
+                edge_routes[frozenset(edge)].add(key)
+
+        self.routes, self.edge_routes, self.matrix = routes, edge_routes, None
+
+    def lookup(self, currency_from, currency_to, at):
+        """Return the latest buy rate of the pair effective at ``at``."""
+
+        pair = self.pairs.get((currency_from, currency_to))
+        if pair is None:
+            return None
+
+        dates, rates = pair
+        index = bisect_right(dates, at)
+        return rates[index - 1] if index else None
+
+    def direct_rate(self, currency_from, currency_to, at):
+        """
+        Return the rate of the pair at ``at``, falling back to the inverse of
+        the reverse pair.
+        """
+
+        rate = self.lookup(currency_from, currency_to, at)
+        if rate is not None:
+            return rate
+
+        rate = self.lookup(currency_to, currency_from, at)
+        if rate:
+            return 1 / rate
+        return None
+
+    def route_rate(self, currency_from, currency_to, at):
+        route = self.routes.get((currency_from, currency_to))
+        if route is None:
+            return None
+
+        rate = self.direct_rate(route[0], route[1], at)
+        for step_from, step_to in zip(route[1:], route[2:]):
+            if rate is None:
+                break
+            step_rate = self.direct_rate(step_from, step_to, at)
+            rate = None if step_rate is None else rate * step_rate
+        return rate
+
+    def build_matrix(self, now) -> None:
+        """Compute the rate of every route at ``now``."""
+
+        cross_rates = {key: self.route_rate(*key, now) for key in self.routes}
+
+        valid_until = None
+        for dates, _rates in self.pairs.values():
+            index = bisect_right(dates, now)
+            if index < len(dates) and (
+                valid_until is None or dates[index] < valid_until
+            ):
+                valid_until = dates[index]
+
+        self.matrix = (cross_rates, valid_until)
+
+    def current_matrix(self, now):
+        matrix = self.matrix
+        if matrix is None or (matrix[1] is not None and now >= matrix[1]):
+            with self._lock:
+                matrix = self.matrix
+                if matrix is None or (matrix[1] is not None and now >= matrix[1]):
+                    self.build_matrix(now)
+                    matrix = self.matrix
+        return matrix
+
+    def insert(self, currency_from, currency_to, effective_date, buy_rate) -> None:
+        """
+        Add one rate, only recomputing the matrix cells of routes through
+        its pair unless it links two currencies for the first time.
+        """
+
+        with self._lock:
+            key = (currency_from, currency_to)
+            new_edge = key not in self.pairs and key[::-1] not in self.pairs
+
+            dates, rates = self.pairs.get(key, ((), ()))
+            index = bisect_right(dates, effective_date)
+            self.pairs[key] = (
+                [*dates[:index], effective_date, *dates[index:]],
+                [*rates[:index], buy_rate, *rates[index:]],
             )
-            if rate_obj := rate_objs.latest():
-                amount = (1 / rate_obj.buy_rate) * amount
+
+            if new_edge:
+                self.find_routes()
+                return
+
+            matrix = self.matrix
+            if matrix is None:
+                return
+
+            cross_rates, valid_until = matrix
+            now = timezone.now()
+            if valid_until is not None and now >= valid_until:
+                self.matrix = None
+            elif effective_date > now:
+                if valid_until is None or effective_date < valid_until:
+                    self.matrix = (cross_rates, effective_date)
+            else:
+                for route in self.edge_routes.get(frozenset(key), ()):
+                    cross_rates[route] = self.route_rate(*route, now)
+
+    def get_rate(self, currency_from, currency_to, at=None):
+        """
+        Return the rate converting ``currency_from`` to ``currency_to`` at
+        ``at`` (default now), or None when no route has a rate in effect.
+        """
+
+        self.refresh()
+        if at is not None:
+            return self.route_rate(currency_from, currency_to, at)
+
+        cross_rates, _valid_until = self.current_matrix(timezone.now())
+        return cross_rates.get((currency_from, currency_to))
+
+
+rate_table = RateTable()
+
+
+def rates_changed() -> None:
+    """
+    Invalidate the rate table of this process, and of every other process
+    that shares the Django cache (see ``cache_is_shared``).
+    """
+
+    # An integer, so single inserts can bump it with an atomic increment
+    cache.set(CURRENCY_RATE_VERSION_KEY, uuid4().int >> 65, timeout=None)
+    rate_table.invalidate()
+
+
+def rate_inserted(rate_id) -> None:
+    """
+    Add a new CurrencyRate to this process' table in place and invalidate
+    the others. The table is kept only when incrementing the shared version
+    yields the version it was loaded at plus one, that is when no other
+    process changed rates in between; otherwise it is reloaded.
+    """
+
+    version = rate_table.version
+    if not isinstance(version, int) or version != get_version(
+        CURRENCY_RATE_VERSION_KEY
+    ):
+        rates_changed()
+        return
+
+    row = (
+        CurrencyRate.objects.filter(pk=rate_id)
+        .values_list("currency_from_id", "currency_to_id", "effective_date", "buy_rate")
+        .first()
+    )
+    if row is not None:
+        rate_table.insert(*row)
+
+    try:
+        new_version = cache.incr(CURRENCY_RATE_VERSION_KEY)
+    except ValueError:
+        # Evicted since it was read
+        rates_changed()
+        return
+
+    if new_version == version + 1:
+        rate_table.version = new_version
+    else:
+        rate_table.invalidate()
+
+
+def _currency_id(currency):
+    return getattr(currency, "pk", currency)
+
+
+def currency_convert(amount, base_currency, to_currency, at=None):
+    """
+    Convert ``amount`` with the rate in effect at ``at`` (default now).
+    Currencies may be CurrencyMaster instances or primary keys. The amount is
+    returned unchanged when there is no rate between the two currencies.
+    """
+
+    base_currency = _currency_id(base_currency)
+    to_currency = _currency_id(to_currency)
+
+    if base_currency != to_currency:
+        rate = rate_table.get_rate(base_currency, to_currency, at)
+        if rate is not None:
+            amount = rate * amount
 
     return amount
+
+
+def currency_convert_many(
+    amounts, base_currency, to_currency, at=None, use_numpy=False
+):
+    """
+    Convert many amounts from ``base_currency`` at once, resolving each rate
+    a single time. ``to_currency`` is either one currency for every amount or
+    a list with one target currency per amount.
+
+    Results equal calling ``currency_convert`` on each amount. With
+    ``use_numpy`` the amounts are converted as a float64 array instead, which
+    is faster for analytics but not exact.
+    """
+
+    amounts = list(amounts)
+    base_currency = _currency_id(base_currency)
+    rates = {}
+
+    def rate_for(currency):
+        if currency not in rates:
+            rate = None
+            if currency != base_currency:
+                rate = rate_table.get_rate(base_currency, currency, at)
+            rates[currency] = rate
+        return rates[currency]
+
+    if isinstance(to_currency, (list, tuple)):
+        if len(to_currency) != len(amounts):
+            raise ValueError("Expected one target currency per amount.")
+        targets = [_currency_id(currency) for currency in to_currency]
+    else:
+        targets = None
+        rate = rate_for(_currency_id(to_currency))
+
+    if use_numpy:
+        if numpy is None:
+            raise ImportError("numpy is required for use_numpy=True.")
+
+        values = numpy.asarray(amounts, dtype=numpy.float64)
+        if targets is None:
+            return values if rate is None else values * float(rate)
+
+        factors = numpy.fromiter(
+            (1.0 if rate is None else float(rate) for rate in map(rate_for, targets)),
+            dtype=numpy.float64,
+            count=len(targets),
+        )
+        return values * factors
+
+    if targets is None:
+        if rate is None:
+            return amounts
+        return [rate * amount for amount in amounts]
+
+    converted = []
+    for amount, currency in zip(amounts, targets):
+        rate = rate_for(currency)
+        converted.append(amount if rate is None else rate * amount)
+    return converted
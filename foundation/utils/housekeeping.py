@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from foundation.models import OneTimePassword, UserAuthenticationOption
+
+
+def _batched_pks(queryset, batch_size):
+    """Yield lists of pks of ``queryset``, walking the primary key index."""
+
+    last_pk = None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def purge_expired_auth_data(batch_size=1000, now=None):
+    """
+    Delete expired OTPs and expired outstanding refresh tokens along with
+    their blacklist entries, ``batch_size`` rows per transaction. Returns the
+    number of rows removed per table.
+    """
+
+    if now is None:
+        now = timezone.now()
+
+    removed = {}
+
+    removed["otp"] = 0
+    for pks in _batched_pks(
+        OneTimePassword.objects.filter(expires_at__lte=now), batch_size
+    ):
+        deleted, _deleted_by_model = OneTimePassword.objects.filter(pk__in=pks).delete()
+        removed["otp"] += deleted
+
+    # Codes written to UserAuthenticationOption before OneTimePassword existed
+    removed["legacy_otp"] = 0
+    for pks in _batched_pks(
+        UserAuthenticationOption.objects.filter(otp_expired_at__lte=now), batch_size
+    ):
+        removed["legacy_otp"] += UserAuthenticationOption.objects.filter(
+            pk__in=pks
+        ).update(otp=None, otp_expired_at=None)
+
+    removed["outstanding_token"] = removed["blacklisted_token"] = 0
+    for pks in _batched_pks(
+        OutstandingToken.objects.filter(expires_at__lte=now), batch_size
+    ):
+        with transaction.atomic():
+            _total, deleted = OutstandingToken.objects.filter(pk__in=pks).delete()
+        removed["outstanding_token"] += deleted.get(OutstandingToken._meta.label, 0)
+        removed["blacklisted_token"] += deleted.get(
+            "token_blacklist.BlacklistedToken", 0
+        )
+
+    return removed
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.utils import timezone
+
+from foundation.api.utils import warm_anonymous_menus
+from foundation.models import Menu
+from foundation.utils.base import get_current_user
+from foundation.utils.cache import MENU_VERSION_KEY, bump_version
+
+
+def reorder_menus(changes) -> int:
+    """
+    Apply many ``{"id": ..., "order": ..., "parent": ...}`` changes at once.
+    ``order`` and ``parent`` are optional, ``parent`` may be None for a root.
+
+    Rows are written with one bulk update, without per-row saves, so
+    ``updated_at`` and ``updated_by`` are set here the way ``BaseModel.save``
+    would. The MPTT tree is rebuilt once if any parent changed. Returns the
+    number of menus changed.
+    """
+
+    changes = list(changes)
+
+    with transaction.atomic():
+        menus = Menu.objects.select_for_update().in_bulk(
+            [change["id"] for change in changes]
+        )
+        parents = dict(Menu.objects.values_list("pk", "parent_id"))
+
+        changed, fields = {}, set()
+        for change in changes:
+            menu = menus.get(change["id"])
+            if menu is None:
+                raise ValueError(f"Menu {change['id']} does not exist.")
+
+            if "order" in change and change["order"] != menu.order:
+                menu.order = change["order"]
+                fields.add("order")
+                changed[menu.pk] = menu
+
+            if "parent" in change and change["parent"] != menu.parent_id:
+                if change["parent"] is not None and change["parent"] not in parents:
+                    raise ValueError(f"Menu {change['parent']} does not exist.")
+                menu.parent_id = parents[menu.pk] = change["parent"]
+                fields.add("parent")
+                changed[menu.pk] = menu
+
+        if "parent" in fields:
+            for pk in changed:
+                ancestor_id = parents[pk]
+                for _depth in range(len(parents)):
+                    if ancestor_id is None:
+                        break
+                    if ancestor_id == pk:
+                        raise ValueError(f"Menu {pk} cannot be moved under itself.")
+                    ancestor_id = parents[ancestor_id]
+
+        if changed:
+            user = get_current_user()
+            now = timezone.now()
+            for menu in changed.values():
+                menu.updated_at = now
+                if user and user.is_authenticated:
+                    menu.updated_by = user
+            fields.update(("updated_at", "updated_by"))
+
+            Menu.objects.bulk_update(changed.values(), fields)
+            if "parent" in fields:
+                Menu.objects.rebuild()
+            # bulk queries send no signals, so refresh the menu caches here
+            transaction.on_commit(lambda: bump_version(MENU_VERSION_KEY))
+            transaction.on_commit(warm_anonymous_menus)
+
+    return len(changed)
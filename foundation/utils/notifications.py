@@ -1,14 +1,11 @@
-import random
-from datetime import timedelta
-
 from constance import config
 from django.conf import settings
 from django.template.loader import render_to_string
-from django.utils import timezone
 from twilio.rest import Client
 
-from foundation.models import User, UserAuthenticationOption
+from foundation.models import User
 from foundation.utils.emails import send_email
+from foundation.utils.otp import OTP_PURPOSE_LOGIN, create_otp
 
 
 def welcome_email_notification(user: User):
@@ -41,8 +38,6 @@ def send_whatsapp_notification(user_whatsapp_number, message):
 
 
 def generate_otp(user: User, otp_method: str) -> None:
-    otp = random.randint(100000, 999999)
-
     if otp_method == "email":
         try:
             if user.email:
@@ -50,11 +45,8 @@ def generate_otp(user: User, otp_method: str) -> None:
                     user.email,
                 ]
 
-                # Save OTP to User model
-                expire_at = timezone.now() + timedelta(minutes=5)
-                UserAuthenticationOption.objects.filter(user=user).update(
-                    otp=otp, otp_expired_at=expire_at
-                )
+                # Save the hashed OTP
+                otp = create_otp(user, OTP_PURPOSE_LOGIN)
 
                 # Send Email to user
                 context = {
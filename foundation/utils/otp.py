@@ -0,0 +1,145 @@
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from foundation.models import OneTimePassword
+
+OTP_PURPOSE_LOGIN = "login"
+
+OTP_VALID = "valid"
+OTP_INVALID = "invalid"
+OTP_EXPIRED = "expired"
+OTP_LOCKED = "locked"
+
+
+def otp_cache_key(user_id, purpose) -> str:
+    return f"foundation:otp:{user_id}:{purpose}"
+
+
+def _hash_code(user_id, purpose, code) -> str:
+    return salted_hmac(
+        "foundation.utils.otp", f"{user_id}:{purpose}:{code}", algorithm="sha256"
+    ).hexdigest()
+
+
+def _get_ttl() -> int:
+    return getattr(settings, "FOUNDATION_OTP_TTL", 300)
+
+
+def _get_max_attempts() -> int:
+    return getattr(settings, "FOUNDATION_OTP_MAX_ATTEMPTS", 5)
+
+
+def create_otp(user, purpose=OTP_PURPOSE_LOGIN) -> str:
+    """
+    Create a new 6 digit code for ``user`` and ``purpose``, replacing any
+    previous one. Only its hash is stored. Returns the code.
+    """
+
+    code = f"{secrets.randbelow(1_000_000):06d}"
+    ttl = _get_ttl()
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    code_hash = _hash_code(user.pk, purpose, code)
+
+    OneTimePassword.objects.update_or_create(
+        user=user,
+        purpose=purpose,
+        defaults={"code_hash": code_hash, "expires_at": expires_at, "attempts": 0},
+    )
+
+    key = otp_cache_key(user.pk, purpose)
+    cache.set_many({key: (code_hash, expires_at), f"{key}:attempts": 0}, timeout=ttl)
+    return code
+
+
+def _load_otp(user_id, purpose):
+    """Return ``(code_hash, expires_at)`` from the cache or the database."""
+
+    key = otp_cache_key(user_id, purpose)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    row = (
+        OneTimePassword.objects.filter(user_id=user_id, purpose=purpose)
+        .values_list("code_hash", "expires_at", "attempts")
+        .first()
+    )
+    if row is None:
+        return None
+
+    code_hash, expires_at, attempts = row
+    timeout = max(int((expires_at - timezone.now()).total_seconds()), 1)
+    cache.set(key, (code_hash, expires_at), timeout=timeout)
+    cache.add(f"{key}:attempts", attempts, timeout=timeout)
+    return code_hash, expires_at
+
+
+def _discard_otp(user_id, purpose) -> None:
+    key = otp_cache_key(user_id, purpose)
+    cache.delete_many([key, f"{key}:attempts"])
+    OneTimePassword.objects.filter(user_id=user_id, purpose=purpose).delete()
+
+
+def _count_attempt(user_id, purpose) -> int:
+    """Atomically count one more attempt and return the new total."""
+
+    attempts_key = f"{otp_cache_key(user_id, purpose)}:attempts"
+    try:
+        return cache.incr(attempts_key)
+    except ValueError:
+        pass
+
+    # Seed the counter from the database; add keeps a concurrent seed
+    attempts = (
+        OneTimePassword.objects.filter(user_id=user_id, purpose=purpose)
+        .values_list("attempts", flat=True)
+        .first()
+        or 0
+    )
+    cache.add(attempts_key, attempts, timeout=_get_ttl())
+    try:
+        return cache.incr(attempts_key)
+    except ValueError:
+        cache.set(attempts_key, attempts + 1, timeout=_get_ttl())
+        return attempts + 1
+
+
+def verify_otp(user_id, purpose, code) -> str:
+    """
+    Check ``code`` against the stored hash in constant time. A matching code
+    is consumed. Returns one of OTP_VALID, OTP_INVALID, OTP_EXPIRED or
+    OTP_LOCKED, the last once the allowed attempts are used up.
+
+    The attempt is counted before the code is compared and a matching code
+    is only valid for the request that deletes it, so concurrent requests
+    can neither exceed the attempts nor use one code twice.
+    """
+
+    entry = _load_otp(user_id, purpose)
+    if entry is None:
+        return OTP_INVALID
+
+    code_hash, expires_at = entry
+    if expires_at <= timezone.now():
+        _discard_otp(user_id, purpose)
+        return OTP_EXPIRED
+
+    if _count_attempt(user_id, purpose) > _get_max_attempts():
+        return OTP_LOCKED
+
+    otp = OneTimePassword.objects.filter(user_id=user_id, purpose=purpose)
+    if constant_time_compare(code_hash, _hash_code(user_id, purpose, code)):
+        deleted, _deleted_by_model = otp.filter(code_hash=code_hash).delete()
+        key = otp_cache_key(user_id, purpose)
+        cache.delete_many([key, f"{key}:attempts"])
+        return OTP_VALID if deleted else OTP_INVALID
+
+    # Kept in the database too for when the cache entry is evicted
+    otp.update(attempts=F("attempts") + 1)
+    return OTP_INVALID
@@ -0,0 +1,351 @@
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from foundation.models import (
+    MenuAction,
+    User,
+    UserEffectivePermission,
+    UserMenuSecurity,
+    UsersMenuPermission,
+    UserTypeMenuPermission,
+)
+
+from foundation.utils.cache import (
+    MENU_VERSION_KEY,
+    LRUCache,
+    bump_version,
+    cache_is_shared,
+    get_versions,
+    permission_version_key,
+)
+
+_pending = threading.local()
+
+_user_permissions = LRUCache(
+    maxsize=getattr(settings, "FOUNDATION_PERMISSION_CACHE_SIZE", 1024)
+)
+_menu_action_bits = LRUCache(maxsize=1)
+
+
+def mask_to_bits(mask: int):
+    """Return the positions of the bits set in ``mask`` in ascending order."""
+
+    bits = []
+    while mask:
+        low_bit = mask & -mask
+        bits.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return bits
+
+
+def refresh_action_masks(model, pks):
+    """
+    Recompute ``action_mask`` of the given UserTypeMenuPermission or
+    UsersMenuPermission rows from their menu_action M2M.
+    Returns ``{pk: action_mask}``.
+    """
+
+    through = model.menu_action.through
+    fk_name = f"{model._meta.model_name}_id"
+    masks = dict.fromkeys(pks, 0)
+
+    for pk, bit in through.objects.filter(**{f"{fk_name}__in": masks}).values_list(
+        fk_name, "menuaction__bit"
+    ):
+        masks[pk] |= 1 << bit
+
+    by_mask = defaultdict(list)
+    for pk, mask in masks.items():
+        by_mask[mask].append(pk)
+    for mask, mask_pks in by_mask.items():
+        model.objects.filter(pk__in=mask_pks).update(action_mask=mask)
+
+    return masks
+
+
+def merge_grants(*grant_rows):
+    """
+    Union ``(user_id, menu_id, action_mask)`` rows into
+    ``{user_id: {menu_id: action_mask}}`` with a bitwise or.
+    """
+
+    grants = defaultdict(lambda: defaultdict(int))
+    for rows in grant_rows:
+        for user_id, menu_id, action_mask in rows:
+            grants[user_id][menu_id] |= action_mask
+
+    return grants
+
+
+def _collect_grants(user_ids):
+    type_rows = UserTypeMenuPermission.objects.filter(
+        user_type__user__in=user_ids
+    ).values_list("user_type__user", "menu_id", "action_mask")
+    user_rows = UsersMenuPermission.objects.filter(
+        users_menu__users__in=user_ids
+    ).values_list("users_menu__users", "menu_id", "action_mask")
+
+    return merge_grants(type_rows, user_rows)
+
+
+def rebuild_user_permissions(user_ids) -> int:
+    """
+    Recompute the effective permission rows of the given users.
+    Returns the number of rows written.
+    """
+
+    user_ids = set(user_ids)
+    if not user_ids:
+        return 0
+
+    with transaction.atomic():
+        # Lock the users so concurrent rebuilds of the same users run one
+        # after the other, each reading the grants committed before it
+        list(
+            User.objects.select_for_update()
+            .filter(pk__in=user_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        grants = _collect_grants(user_ids)
+
+        UserEffectivePermission.objects.filter(user_id__in=user_ids).delete()
+        permissions = UserEffectivePermission.objects.bulk_create(
+            [
+                UserEffectivePermission(
+                    user_id=user_id, menu_id=menu_id, action_mask=action_mask
+                )
+                for user_id, menus in grants.items()
+                for menu_id, action_mask in menus.items()
+            ]
+        )
+        transaction.on_commit(
+            lambda: bump_version(*map(permission_version_key, user_ids))
+        )
+
+    return len(permissions)
+
+
+def rebuild_all_user_permissions(batch_size=500) -> int:
+    """Recompute the effective permission rows of every user."""
+
+    count = 0
+    user_ids = User.objects.order_by("id").values_list("id", flat=True)
+
+    with transaction.atomic():
+        UserEffectivePermission.objects.all().delete()
+
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                count += rebuild_user_permissions(batch)
+                batch = []
+        count += rebuild_user_permissions(batch)
+
+    return count
+
+
+def _flush_permission_rebuild():
+    user_ids = getattr(_pending, "user_ids", None)
+    _pending.user_ids = set()
+    if user_ids:
+        rebuild_user_permissions(user_ids)
+
+
+def schedule_permission_rebuild(user_ids) -> None:
+    """
+    Queue a rebuild of the given users once the current transaction commits,
+    so a nested form save touching many rows rebuilds each user only once.
+    """
+
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    if not hasattr(_pending, "user_ids"):
+        _pending.user_ids = set()
+    _pending.user_ids.update(user_ids)
+    transaction.on_commit(_flush_permission_rebuild)
+
+
+def users_of_user_type(user_type_id):
+    return User.objects.filter(user_type_id=user_type_id).values_list("id", flat=True)
+
+
+def users_of_menu_security(users_menu_id):
+    through = UserMenuSecurity.users.through
+    return through.objects.filter(usermenusecurity_id=users_menu_id).values_list(
+        "user_id", flat=True
+    )
+
+
+def users_of_permissions(model, permission_ids):
+    """Return ids of users granted the given permission rows of ``model``."""
+
+    if model is UserTypeMenuPermission:
+        return User.objects.filter(
+            user_type__usertype_menu_set__in=permission_ids
+        ).values_list("id", flat=True)
+
+    return UserMenuSecurity.users.through.objects.filter(
+        usermenusecurity__users_menu_set__in=permission_ids
+    ).values_list("user_id", flat=True)
+
+
+def permissions_of_menu_action(model, action_id):
+    fk_name = f"{model._meta.model_name}_id"
+    return model.menu_action.through.objects.filter(
+        menuaction_id=action_id
+    ).values_list(fk_name, flat=True)
+
+
+def bulk_update_user_type_permissions(user_type, grant=(), revoke=(), user=None):
+    """
+    Grant and revoke menu actions of a user type in one transaction using
+    set based queries on the permission and through tables.
+
+    ``grant`` and ``revoke`` are iterables of ``(menu_ids, action_ids)``
+    pairs, each one meaning every action on every menu. Revokes apply after
+    grants. Returns the number of permission rows created and of action
+    grants added and removed.
+    """
+
+    through = UserTypeMenuPermission.menu_action.through
+    permissions = UserTypeMenuPermission.objects.filter(user_type=user_type)
+    grant_pairs = {
+        (menu_id, action_id)
+        for menu_ids, action_ids in grant
+        for menu_id in menu_ids
+        for action_id in action_ids
+    }
+    result = {"created": 0, "granted": 0, "revoked": 0}
+
+    with transaction.atomic():
+        if grant_pairs:
+            menu_ids = {menu_id for menu_id, _action_id in grant_pairs}
+            existing = set(
+                permissions.filter(menu_id__in=menu_ids).values_list(
+                    "menu_id", flat=True
+                )
+            )
+            created = UserTypeMenuPermission.objects.bulk_create(
+                [
+                    UserTypeMenuPermission(
+                        user_type=user_type,
+                        menu_id=menu_id,
+                        created_by=user,
+                        updated_by=user,
+                    )
+                    for menu_id in menu_ids - existing
+                ]
+            )
+            result["created"] = len(created)
+
+            permission_ids = dict(
+                permissions.filter(menu_id__in=menu_ids).values_list("menu_id", "pk")
+            )
+            granted = set(
+                through.objects.filter(
+                    usertypemenupermission_id__in=permission_ids.values()
+                ).values_list("usertypemenupermission_id", "menuaction_id")
+            )
+            new_rows = [
+                through(
+                    usertypemenupermission_id=permission_ids[menu_id],
+                    menuaction_id=action_id,
+                )
+                for menu_id, action_id in grant_pairs
+                if (permission_ids[menu_id], action_id) not in granted
+            ]
+            through.objects.bulk_create(new_rows)
+            result["granted"] = len(new_rows)
+
+        for menu_ids, action_ids in revoke:
+            deleted, _deleted_by_model = through.objects.filter(
+                usertypemenupermission__in=permissions.filter(menu_id__in=menu_ids),
+                menuaction_id__in=action_ids,
+            ).delete()
+            result["revoked"] += deleted
+
+        # Bulk queries skip the signals keeping masks and users in sync
+        refresh_action_masks(
+            UserTypeMenuPermission, permissions.values_list("pk", flat=True)
+        )
+        schedule_permission_rebuild(users_of_user_type(user_type.pk))
+
+    return result
+
+
+def _load_user_menu_permissions(user_id):
+    return dict(
+        UserEffectivePermission.objects.filter(user_id=user_id).values_list(
+            "menu__slug", "action_mask"
+        )
+    )
+
+
+def _load_menu_action_bits():
+    return {
+        action: 1 << bit
+        for action, bit in MenuAction.objects.values_list("action", "bit")
+    }
+
+
+def get_user_menu_permissions(user_id):
+    """
+    Return ``{menu_slug: action_mask}`` of a user from the per-process LRU.
+    Entries are reloaded when the user's permissions or the menus change.
+    The LRU is skipped unless the cache is shared between processes.
+    """
+
+    if not cache_is_shared():
+        return _load_user_menu_permissions(user_id)
+
+    version_key = permission_version_key(user_id)
+    versions = get_versions([MENU_VERSION_KEY, version_key])
+    version = (versions[MENU_VERSION_KEY], versions[version_key])
+
+    entry = _user_permissions.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    permissions = _load_user_menu_permissions(user_id)
+    _user_permissions.set(user_id, (version, permissions))
+    return permissions
+
+
+def get_menu_action_bits():
+    """Return ``{action name: bit}`` of every menu action."""
+
+    if not cache_is_shared():
+        return _load_menu_action_bits()
+
+    version = get_versions([MENU_VERSION_KEY])[MENU_VERSION_KEY]
+
+    entry = _menu_action_bits.get(MENU_VERSION_KEY)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    bits = _load_menu_action_bits()
+    _menu_action_bits.set(MENU_VERSION_KEY, (version, bits))
+    return bits
+
+
+def has_menu_action(user, menu_slug: str, action: str) -> bool:
+    """
+    Return whether ``user`` may perform ``action`` (e.g. "view", "edit") on
+    the menu identified by ``menu_slug``.
+    """
+
+    if not user or not user.is_authenticated:
+        return False
+
+    bit = get_menu_action_bits().get(action)
+    if bit is None:
+        return False
+
+    return bool(get_user_menu_permissions(user.pk).get(menu_slug, 0) & bit)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PoolFull(Exception):
+    pass
+
+
+class BoundedPool:
+    """
+    A thread pool with a limit on waiting tasks. Submitting past the limit
+    raises PoolFull instead of growing an unbounded queue. ``stats()`` gives
+    the current queue depth and counters.
+    """
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix=self.name
+                    )
+        return self._executor
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queued": self._pending - self._running,
+                "running": self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def _call(self, func, args, kwargs):
+        with self._lock:
+            self._running += 1
+        # Worker threads keep their own database connections
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._completed += 1
+
+    def submit(self, func, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self._rejected += 1
+                rejected = self._rejected
+                full = True
+            else:
+                self._pending += 1
+                full = False
+
+        if full:
+            logger.warning("%s pool is full, %s tasks rejected.", self.name, rejected)
+            raise PoolFull(self.name)
+
+        return self.executor.submit(self._call, func, args, kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+
+auth_pool = BoundedPool(
+    "auth",
+    workers=getattr(settings, "FOUNDATION_AUTH_POOL_WORKERS", 4),
+    queue_size=getattr(settings, "FOUNDATION_AUTH_POOL_QUEUE_SIZE", 64),
+)
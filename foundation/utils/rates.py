@@ -0,0 +1,351 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from foundation.models import CurrencyMaster, CurrencyRate, CurrencyRateLatest
+from foundation.utils.cache import (
+    CURRENCY_VERSION_KEY,
+    LRUCache,
+    cache_is_shared,
+    get_version,
+)
+from foundation.utils.converter import rates_changed
+
+LATEST_FIELDS = ("rate", "buy_rate", "sell_rate", "effective_date")
+HISTORY_EDGE_BATCH_SIZE = 900
+PROMOTED_AT_CACHE_KEY = "foundation:currency_rate_promoted_at"
+
+_currency_codes = LRUCache(maxsize=1)
+
+
+def _save_latest(rates) -> int:
+    if not connection.features.supports_update_conflicts_with_target:
+        # MySQL can't upsert on given unique fields, save the rows one by one
+        for rate in rates:
+            CurrencyRateLatest.objects.update_or_create(
+                currency_from_id=rate.currency_from_id,
+                currency_to_id=rate.currency_to_id,
+                defaults={
+                    "rate": rate,
+                    "buy_rate": rate.buy_rate,
+                    "sell_rate": rate.sell_rate,
+                    "effective_date": rate.effective_date,
+                },
+            )
+        return len(rates)
+
+    CurrencyRateLatest.objects.bulk_create(
+        [
+            CurrencyRateLatest(
+                currency_from_id=rate.currency_from_id,
+                currency_to_id=rate.currency_to_id,
+                rate=rate,
+                buy_rate=rate.buy_rate,
+                sell_rate=rate.sell_rate,
+                effective_date=rate.effective_date,
+            )
+            for rate in rates
+        ],
+        update_conflicts=True,
+        unique_fields=["currency_from", "currency_to"],
+        update_fields=LATEST_FIELDS,
+    )
+    return len(rates)
+
+
+def refresh_latest_rates(pairs, now=None) -> int:
+    """
+    Recompute the CurrencyRateLatest rows of the given ``(currency_from_id,
+    currency_to_id)`` pairs from their history. Returns the number of pairs
+    that have a rate in effect.
+    """
+
+    if now is None:
+        now = timezone.now()
+
+    rates = []
+    for currency_from, currency_to in set(pairs):
+        rate = (
+            CurrencyRate.objects.filter(
+                currency_from=currency_from,
+                currency_to=currency_to,
+                effective_date__lte=now,
+            )
+            .order_by("-effective_date", "-id")
+            .first()
+        )
+        if rate is None:
+            CurrencyRateLatest.objects.filter(
+                currency_from=currency_from, currency_to=currency_to
+            ).delete()
+        else:
+            rates.append(rate)
+
+    return _save_latest(rates)
+
+
+def promote_latest_rates(now=None) -> int:
+    """
+    Move CurrencyRateLatest forward to rates whose effective date has
+    passed. Returns the number of pairs promoted.
+
+    Only rates that took effect since the previous run, less
+    ``FOUNDATION_CURRENCY_RATE_PROMOTE_OVERLAP`` seconds for transactions
+    still open back then, are looked at. The whole history is only scanned
+    when the time of the previous run is not in the cache.
+    """
+
+    if now is None:
+        now = timezone.now()
+
+    candidates = CurrencyRate.objects.filter(effective_date__lte=now)
+    promoted_at = cache.get(PROMOTED_AT_CACHE_KEY)
+    if promoted_at is not None:
+        overlap = getattr(settings, "FOUNDATION_CURRENCY_RATE_PROMOTE_OVERLAP", 3600)
+        candidates = candidates.filter(
+            effective_date__gt=promoted_at - timedelta(seconds=overlap)
+        )
+
+    current = CurrencyRateLatest.objects.filter(
+        currency_from=OuterRef("currency_from"), currency_to=OuterRef("currency_to")
+    )
+    candidates = (
+        candidates.annotate(
+            current_date=Subquery(current.values("effective_date")[:1]),
+            current_rate=Subquery(current.values("rate")[:1]),
+        )
+        .filter(
+            Q(current_date__isnull=True)
+            | Q(effective_date__gt=F("current_date"))
+            | Q(effective_date=F("current_date"), id__gt=F("current_rate"))
+        )
+        .order_by("effective_date", "id")
+    )
+
+    newest = {}
+    for rate in candidates.iterator():
+        newest[(rate.currency_from_id, rate.currency_to_id)] = rate
+
+    count = _save_latest(list(newest.values()))
+    cache.set(PROMOTED_AT_CACHE_KEY, now, timeout=None)
+    return count
+
+
+def get_currency_code_map():
+    """Return ``{currency code: pk}`` with upper case codes."""
+
+    if not cache_is_shared():
+        return _load_currency_code_map()
+
+    version = get_version(CURRENCY_VERSION_KEY)
+
+    entry = _currency_codes.get(CURRENCY_VERSION_KEY)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    codes = _load_currency_code_map()
+    _currency_codes.set(CURRENCY_VERSION_KEY, (version, codes))
+    return codes
+
+
+def _load_currency_code_map():
+    return {
+        code.upper(): pk
+        for pk, code in CurrencyMaster.objects.values_list("pk", "currency_code")
+    }
+
+
+def read_rate_rows(path, file_format=None):
+    """
+    Stream rate rows from a CSV or NDJSON file as dicts with the keys
+    currency_from, currency_to, buy_rate, sell_rate and effective_date.
+    The format is taken from the file extension unless given.
+    """
+
+    path = Path(path)
+    file_format = file_format or ("csv" if path.suffix == ".csv" else "ndjson")
+
+    with path.open(newline="", encoding="utf-8") as file:
+        if file_format == "csv":
+            yield from csv.DictReader(file)
+        elif file_format == "ndjson":
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unknown rate file format: {file_format}")
+
+
+def _parse_rate_row(line, row, codes, now):
+    try:
+        currency_from = codes[str(row["currency_from"]).strip().upper()]
+        currency_to = codes[str(row["currency_to"]).strip().upper()]
+    except KeyError as err:
+        raise ValueError(f"Row {line}: unknown currency {err}.") from None
+
+    try:
+        buy_rate = Decimal(str(row["buy_rate"]))
+        sell_rate = Decimal(str(row.get("sell_rate") or "0"))
+    except (KeyError, InvalidOperation):
+        raise ValueError(f"Row {line}: invalid rate.") from None
+
+    effective_date = now
+    if row.get("effective_date"):
+        effective_date = parse_datetime(str(row["effective_date"]))
+        if effective_date is None:
+            raise ValueError(f"Row {line}: invalid effective_date.")
+        if settings.USE_TZ and timezone.is_naive(effective_date):
+            effective_date = timezone.make_aware(effective_date)
+
+    return currency_from, currency_to, buy_rate, sell_rate, effective_date
+
+
+def _copy_rates(rows, user_id, now) -> None:
+    """Insert rows with PostgreSQL COPY."""
+
+    table = CurrencyRate._meta.db_table
+    user = "\\N" if user_id is None else str(user_id)
+    buffer = io.StringIO()
+    for currency_from, currency_to, buy_rate, sell_rate, effective_date in rows:
+        buffer.write(
+            f"{currency_from}\t{currency_to}\t{buy_rate}\t{sell_rate}\t"
+            f"{effective_date.isoformat()}\t{now.isoformat()}\t{now.isoformat()}\t"
+            f"{user}\t{user}\n"
+        )
+
+    sql = (
+        f'COPY "{table}" (currency_from_id, currency_to_id, buy_rate, sell_rate, '
+        "effective_date, created_at, updated_at, created_by_id, updated_by_id) "
+        "FROM STDIN"
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def import_currency_rates(
+    path, file_format=None, batch_size=5000, user_id=None, use_copy=True
+) -> int:
+    """
+    Insert every rate of a CSV or NDJSON file in batches, with COPY on
+    PostgreSQL when ``use_copy`` is set and ``bulk_create`` elsewhere. The
+    whole file is imported in one transaction. Returns the number of rates.
+    """
+
+    codes = get_currency_code_map()
+    now = timezone.now()
+    use_copy = use_copy and connection.vendor == "postgresql"
+    pairs = set()
+    count = 0
+
+    def insert(batch):
+        if use_copy:
+            _copy_rates(batch, user_id, now)
+        else:
+            CurrencyRate.objects.bulk_create(
+                [
+                    CurrencyRate(
+                        currency_from_id=currency_from,
+                        currency_to_id=currency_to,
+                        buy_rate=buy_rate,
+                        sell_rate=sell_rate,
+                        effective_date=effective_date,
+                        created_by_id=user_id,
+                        updated_by_id=user_id,
+                    )
+                    for currency_from, currency_to, buy_rate, sell_rate, effective_date in batch
+                ]
+            )
+
+    with transaction.atomic():
+        batch = []
+        for line, row in enumerate(read_rate_rows(path, file_format), start=1):
+            batch.append(_parse_rate_row(line, row, codes, now))
+            pairs.add(batch[-1][:2])
+            if len(batch) >= batch_size:
+                insert(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            insert(batch)
+            count += len(batch)
+
+        # Bulk inserts send no signals
+        refresh_latest_rates(pairs)
+        transaction.on_commit(rates_changed)
+
+    return count
+
+
+def rate_history(
+    currency_from, currency_to, interval="day", ohlc=True, start=None, end=None
+):
+    """
+    Bucket the buy rates of a pair by ``interval`` (hour, day, week or month)
+    in the database. Returns columns of equal length: ``time`` (bucket start
+    as a unix timestamp) and ``close``, plus ``open``, ``high``, ``low`` and
+    ``count`` when ``ohlc`` is set.
+    """
+
+    rates = CurrencyRate.objects.filter(
+        currency_from=currency_from, currency_to=currency_to
+    )
+    if start is not None:
+        rates = rates.filter(effective_date__gte=start)
+    if end is not None:
+        rates = rates.filter(effective_date__lte=end)
+
+    aggregates = {"first": Min("effective_date"), "last": Max("effective_date")}
+    if ohlc:
+        aggregates.update(high=Max("buy_rate"), low=Min("buy_rate"), count=Count("id"))
+    buckets = list(
+        rates.annotate(bucket=Trunc("effective_date", interval))
+        .values("bucket")
+        .annotate(**aggregates)
+        .order_by("bucket")
+    )
+
+    # Open and close are the rates at the first and last date of a bucket,
+    # the latest row winning ties like ``latest()`` does.
+    edges = {bucket["last"] for bucket in buckets}
+    if ohlc:
+        edges.update(bucket["first"] for bucket in buckets)
+    edges = sorted(edges)
+    edge_rates = {}
+    for index in range(0, len(edges), HISTORY_EDGE_BATCH_SIZE):
+        edge_rates.update(
+            rates.filter(
+                effective_date__in=edges[index : index + HISTORY_EDGE_BATCH_SIZE]
+            )
+            .order_by("effective_date", "id")
+            .values_list("effective_date", "buy_rate")
+        )
+
+    columns = {
+        "time": [int(bucket["bucket"].timestamp()) for bucket in buckets],
+        "close": [float(edge_rates[bucket["last"]]) for bucket in buckets],
+    }
+    if ohlc:
+        columns.update(
+            open=[float(edge_rates[bucket["first"]]) for bucket in buckets],
+            high=[float(bucket["high"]) for bucket in buckets],
+            low=[float(bucket["low"]) for bucket in buckets],
+            count=[bucket["count"] for bucket in buckets],
+        )
+    return columns
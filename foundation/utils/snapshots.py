@@ -0,0 +1,179 @@
+import json
+import mmap
+import struct
+from array import array
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from foundation.utils.converter import _currency_id, rate_table
+
+SNAPSHOT_MAGIC = b"FRS1"
+RATE_SCALE = 4
+
+
+def _to_fixed(rate) -> int:
+    return int(rate.scaleb(RATE_SCALE))
+
+
+def _from_fixed(value: int) -> Decimal:
+    return Decimal(value).scaleb(-RATE_SCALE)
+
+
+class RateSnapshot:
+    """
+    The buy rate of every currency pair at the end of each day of a date
+    range, stored as one int64 per pair per day in fixed point (rate times
+    10^4, 0 when there is no rate). Conversions route between currencies
+    like ``currency_convert`` does, so converting on a day gives the same
+    result as ``currency_convert`` at the end of that day.
+
+    Snapshots can be written to disk and memory mapped by other processes.
+    """
+
+    def __init__(self, start, days, pairs, routes, values, buffer=None):
+        self.start = start
+        self.days = days
+        self.pairs = {pair: index for index, pair in enumerate(pairs)}
+        self.routes = routes
+        self.values = values
+        self._buffer = buffer
+        self._rates = {}
+
+    @staticmethod
+    def day_end(day):
+        end = datetime.combine(day, time.max)
+        if settings.USE_TZ:
+            end = timezone.make_aware(end)
+        return end
+
+    @classmethod
+    def as_of(cls, start, end):
+        """Build a snapshot of the days from ``start`` to ``end`` inclusive."""
+
+        rate_table.refresh()
+        days = (end - start).days + 1
+        if days < 1:
+            raise ValueError("end must not be before start.")
+
+        day_ends = [cls.day_end(start + timedelta(days=day)) for day in range(days)]
+        pairs = list(rate_table.pairs)
+        values = array("q")
+        for currency_from, currency_to in pairs:
+            for day_end in day_ends:
+                rate = rate_table.lookup(currency_from, currency_to, day_end)
+                values.append(0 if rate is None else _to_fixed(rate))
+
+        return cls(start, days, pairs, dict(rate_table.routes), values)
+
+    def save(self, path) -> None:
+        header = json.dumps(
+            {
+                "start": self.start.isoformat(),
+                "days": self.days,
+                "pairs": list(self.pairs),
+                "routes": list(self.routes.values()),
+            }
+        ).encode()
+        # Pad the header so the values start 8 byte aligned
+        header += b" " * (-(len(SNAPSHOT_MAGIC) + 4 + len(header)) % 8)
+
+        with open(path, "wb") as file:
+            file.write(SNAPSHOT_MAGIC)
+            file.write(struct.pack("<I", len(header)))
+            file.write(header)
+            file.write(self.values.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Memory map a snapshot written by ``save``."""
+
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if buffer[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            buffer.close()
+            raise ValueError(f"{path} is not a rate snapshot.")
+
+        offset = len(SNAPSHOT_MAGIC) + 4
+        (length,) = struct.unpack_from("<I", buffer, len(SNAPSHOT_MAGIC))
+        header = json.loads(buffer[offset : offset + length])
+        values = memoryview(buffer)[offset + length :].cast("q")
+
+        return cls(
+            date.fromisoformat(header["start"]),
+            header["days"],
+            [tuple(pair) for pair in header["pairs"]],
+            {(route[0], route[-1]): tuple(route) for route in header["routes"]},
+            values,
+            buffer=buffer,
+        )
+
+    def close(self) -> None:
+        if self._buffer is not None:
+            self.values.release()
+            self._buffer.close()
+            self._buffer = None
+
+    def day_index(self, day) -> int:
+        if isinstance(day, datetime):
+            if settings.USE_TZ and timezone.is_aware(day):
+                day = timezone.localtime(day)
+            day = day.date()
+
+        index = (day - self.start).days
+        if not 0 <= index < self.days:
+            raise ValueError(f"{day} is outside the snapshot.")
+        return index
+
+    def _direct_rate(self, currency_from, currency_to, index):
+        pair = self.pairs.get((currency_from, currency_to))
+        if pair is not None and self.values[pair * self.days + index]:
+            return _from_fixed(self.values[pair * self.days + index])
+
+        pair = self.pairs.get((currency_to, currency_from))
+        if pair is not None and self.values[pair * self.days + index]:
+            return 1 / _from_fixed(self.values[pair * self.days + index])
+        return None
+
+    def _route_rate(self, currency_from, currency_to, index):
+        route = self.routes.get((currency_from, currency_to))
+        if route is None:
+            return None
+
+        rate = self._direct_rate(route[0], route[1], index)
+        for step_from, step_to in zip(route[1:], route[2:]):
+            if rate is None:
+                break
+            step_rate = self._direct_rate(step_from, step_to, index)
+            rate = None if step_rate is None else rate * step_rate
+        return rate
+
+    def get_rate(self, currency_from, currency_to, day):
+        """Return the rate at the end of ``day``, or None."""
+
+        key = (
+            _currency_id(currency_from),
+            _currency_id(currency_to),
+            self.day_index(day),
+        )
+        try:
+            return self._rates[key]
+        except KeyError:
+            rate = self._rates[key] = self._route_rate(*key)
+            return rate
+
+    def convert(self, amount, base_currency, to_currency, day):
+        """Convert ``amount`` like ``currency_convert`` at the end of ``day``."""
+
+        base_currency = _currency_id(base_currency)
+        to_currency = _currency_id(to_currency)
+
+        if base_currency != to_currency:
+            rate = self.get_rate(base_currency, to_currency, day)
+            if rate is not None:
+                amount = rate * amount
+
+        return amount
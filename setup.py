@@ -20,5 +20,9 @@ setup(
         "drf-writable-nested",
         "django-mptt",
         "Pillow",
-    ]
+    ],
+    extras_require={
+        "brotli": ["brotli"],
+        "numpy": ["numpy"],
+    },
 )